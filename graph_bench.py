@@ -0,0 +1,252 @@
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import numpy as np
+import graph_core
+from graph_cli import ALGORITHMS
+
+
+DEFAULT_ALGORITHMS = ["shortest_path", "dijkstra", "bfs", "dfs", "astar"]
+
+# Structures some algorithms build once before answering queries
+PREPROCESSING = {
+    "alt": lambda graph_tool: graph_tool.build_landmarks(),
+    "ch": lambda graph_tool: graph_tool.build_contraction_hierarchy(),
+    "chain": lambda graph_tool: graph_tool.build_chain_compression(),
+}
+
+
+def random_geometric_graph(n, degree=6, size=1000.0, seed=0):
+    # n random points in a size x size square, each connected to every point
+    # within the radius that gives the requested mean degree. Weights are the
+    # Euclidean distances add_edge computes when no weight is given.
+    rng = random.Random(seed)
+    graph_tool = graph_core.GraphTool()
+    points = [(rng.uniform(0, size), rng.uniform(0, size)) for _ in range(n)]
+    for point in points:
+        graph_tool.add_node(point)
+
+    radius = size * math.sqrt(degree / (math.pi * max(n, 1)))
+    buckets = {}
+    for node, (x, y) in enumerate(points):
+        buckets.setdefault((int(x // radius), int(y // radius)), []).append(node)
+    for (bx, by), nodes in buckets.items():
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for node in nodes:
+                    for other in buckets.get((bx + dx, by + dy), ()):
+                        if node < other and math.dist(points[node], points[other]) <= radius:
+                            graph_tool.add_edge(node, other)
+    return graph_tool
+
+
+def grid_graph(rows, cols, spacing=10.0):
+    graph_tool = graph_core.GraphTool()
+    for r in range(rows):
+        for c in range(cols):
+            graph_tool.add_node((c * spacing, r * spacing))
+    for r in range(rows):
+        for c in range(cols):
+            node = r * cols + c
+            if c + 1 < cols:
+                graph_tool.add_edge(node, node + 1)
+            if r + 1 < rows:
+                graph_tool.add_edge(node, node + cols)
+    return graph_tool
+
+
+def load_graph(filename):
+    graph_tool = graph_core.GraphTool()
+    graph_tool.load(filename)
+    return graph_tool
+
+
+def query_set(graph_tool, count, seed):
+    # The same seed gives the same pairs on the same graph, run after run
+    rng = random.Random(seed)
+    nodes = sorted(graph_tool.csr.node_list)
+    return [(rng.choice(nodes), rng.choice(nodes)) for _ in range(count)]
+
+
+def percentiles(samples):
+    values = np.asarray(samples, dtype=np.float64) * 1000.0
+    if not len(values):
+        return {}
+    return {
+        'p50_ms': float(np.percentile(values, 50)),
+        'p90_ms': float(np.percentile(values, 90)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'max_ms': float(values.max()),
+        'mean_ms': float(values.mean()),
+    }
+
+
+def bench_algorithm(graph_tool, algorithm, queries, memory_queries):
+    search = getattr(graph_tool, ALGORITHMS[algorithm])
+    result = {'algorithm': algorithm}
+
+    if algorithm in PREPROCESSING:
+        started = time.perf_counter()
+        PREPROCESSING[algorithm](graph_tool)
+        result['preprocess_seconds'] = time.perf_counter() - started
+
+    latencies, settled, failures = [], [], 0
+    for start, end in queries:
+        # Every query starts cold; the cache would otherwise answer repeats
+        graph_tool.query_cache.clear()
+        started = time.perf_counter()
+        nodes, _, _ = search(start, end)
+        latencies.append(time.perf_counter() - started)
+        settled.append(graph_tool.last_stats.get('settled', 0))
+        failures += not nodes
+    result.update(percentiles(latencies))
+    result['queries'] = len(queries)
+    result['unreachable'] = failures
+    result['settled_mean'] = float(np.mean(settled)) if settled else 0.0
+    result['settled_max'] = int(max(settled, default=0))
+
+    # Peak allocation is measured separately since tracing slows every query
+    peak = 0
+    for start, end in queries[:memory_queries]:
+        graph_tool.query_cache.clear()
+        tracemalloc.start()
+        search(start, end)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    result['peak_memory_bytes'] = peak
+    return result
+
+
+def random_changes(graph_tool, count, rng, removals=0.1):
+    # Weight changes by a factor of 0.5 to 2 on random edges, some removed
+    edges = list(graph_tool.graph.edges(data='weight', default=1.0))
+    changes = []
+    for node1, node2, weight in rng.sample(edges, min(count, len(edges))):
+        changes.append((node1, node2, None if rng.random() < removals else weight * rng.uniform(0.5, 2.0)))
+    return changes
+
+
+def bench_updates(graph_tool, batch_sizes, tree_count, seed):
+    # Edge update batches against complete shortest-path trees of a few
+    # sources: update_edges (patch + tree repair) versus rebuilding the search
+    # arrays and recomputing the trees from scratch
+    rng = random.Random(seed)
+    sources = graph_tool.csr.indices(*{start for start, _ in query_set(graph_tool, tree_count, seed)})
+    results = []
+    for batch_size in batch_sizes:
+        graph_tool.query_cache.clear()
+        for source in sources:
+            graph_tool.query_cache.tree(graph_tool.csr, source).settle_until(None)
+        changes = random_changes(graph_tool, batch_size, rng)
+
+        started = time.perf_counter()
+        graph_tool.update_edges(changes)
+        update_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        csr = graph_core.CSRGraph.from_graph(graph_tool.graph, graph_tool.positions)
+        fresh = []
+        for source in sources:
+            tree = graph_core.ShortestPathTree(csr, source)
+            tree.settle_until(None)
+            fresh.append(tree)
+        recompute_seconds = time.perf_counter() - started
+
+        mismatches = 0
+        for tree in fresh:
+            repaired = graph_tool.query_cache.tree(graph_tool.csr, tree.source)
+            mismatches += sum(abs(repaired.dist.get(v, math.inf) - d) > 1e-9 for v, d in tree.dist.items()
+                              if v in tree.position)
+        results.append({
+            'batch_size': len(changes),
+            'trees': len(sources),
+            'update_seconds': update_seconds,
+            'recompute_seconds': recompute_seconds,
+            'speedup': recompute_seconds / update_seconds if update_seconds else None,
+            'mismatches': mismatches,
+        })
+    return results
+
+
+def bench_graph(name, build, algorithms, query_count, memory_queries, seed, update_batches=(), update_trees=4):
+    started = time.perf_counter()
+    graph_tool = build()
+    load_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    graph_tool.csr
+    csr_seconds = time.perf_counter() - started
+
+    queries = query_set(graph_tool, query_count, seed)
+    report = {
+        'graph': name,
+        'nodes': len(graph_tool.csr),
+        'edges': len(graph_tool.csr.targets) // 2,
+        'load_seconds': load_seconds,
+        'csr_build_seconds': csr_seconds,
+        'results': [bench_algorithm(graph_tool, algorithm, queries, memory_queries) for algorithm in algorithms],
+    }
+    # Last, since the updates change the graph
+    if update_batches:
+        report['updates'] = bench_updates(graph_tool, update_batches, update_trees, seed)
+    return report
+
+
+def parse_grid(value):
+    rows, _, cols = value.lower().partition('x')
+    return int(rows), int(cols or rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the GraphTool search algorithms.")
+    parser.add_argument('--random', type=int, nargs='*', default=[], metavar='N',
+                        help="random geometric graphs with N nodes")
+    parser.add_argument('--degree', type=float, default=6, help="mean degree of the random graphs")
+    parser.add_argument('--grid', nargs='*', default=[], metavar='RxC', help="grid graphs, e.g. 100x100")
+    parser.add_argument('--graph', nargs='*', default=[], metavar='FILE', help="saved .graph files")
+    parser.add_argument('--algorithms', nargs='+', default=DEFAULT_ALGORITHMS,
+                        choices=sorted(ALGORITHMS) + ['all'])
+    parser.add_argument('--queries', type=int, default=100, help="queries per graph")
+    parser.add_argument('--memory-queries', type=int, default=10,
+                        help="queries re-run under tracemalloc for peak memory")
+    parser.add_argument('--updates', type=int, nargs='*', default=[], metavar='N',
+                        help="also time edge update batches of N changes against full recomputation")
+    parser.add_argument('--update-trees', type=int, default=4,
+                        help="shortest-path trees kept up to date during the update benchmark")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    algorithms = sorted(ALGORITHMS) if 'all' in args.algorithms else args.algorithms
+    graphs = [(f"random-{n}", lambda n=n: random_geometric_graph(n, args.degree, seed=args.seed))
+              for n in args.random]
+    graphs += [(f"grid-{value}", lambda value=value: grid_graph(*parse_grid(value))) for value in args.grid]
+    graphs += [(filename, lambda filename=filename: load_graph(filename)) for filename in args.graph]
+    if not graphs:
+        parser.error("give at least one of --random, --grid or --graph")
+
+    report = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'seed': args.seed,
+        'graphs': [bench_graph(name, build, algorithms, args.queries, args.memory_queries, args.seed,
+                               args.updates, args.update_trees)
+                   for name, build in graphs],
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
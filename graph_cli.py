@@ -0,0 +1,229 @@
+import argparse
+import csv
+import json
+import math
+import sys
+import networkx as nx
+import graph_core
+
+
+# Command line name -> GraphTool search method
+ALGORITHMS = {
+    "shortest_path": "shortest_path",
+    "dijkstra": "dijkstra",
+    "bfs": "bfs",
+    "dfs": "dfs",
+    "astar": "astar_search",
+    "alt": "alt_search",
+    "bidirectional_dijkstra": "bidirectional_dijkstra",
+    "bidirectional_astar": "bidirectional_astar",
+    "ch": "ch_search",
+    "chain": "chain_search",
+    "k_shortest": "k_shortest_paths",
+    "alternatives": "alternative_routes",
+}
+
+# Searches returning several routes; they take the number of routes as k
+ROUTE_ALGORITHMS = {"k_shortest", "alternatives"}
+
+
+def read_pairs(filename):
+    # CSV with start,end per line; a non-numeric first line is taken as a header
+    pairs = []
+    with open(filename, newline='') as f:
+        for row in csv.reader(f):
+            if not row:
+                continue
+            try:
+                pairs.append((int(row[0]), int(row[1])))
+            except ValueError:
+                if pairs:
+                    raise
+    return pairs
+
+
+def run_queries(graph_tool, algorithm, pairs, k=3):
+    search = getattr(graph_tool, ALGORITHMS[algorithm])
+    options = {'k': k} if algorithm in ROUTE_ALGORITHMS else {}
+    results = []
+    for start, end in pairs:
+        nodes, path_edges, order = search(start, end, **options)
+        routes = graph_tool.last_stats.get('paths') if nodes else None
+        if routes:
+            path = routes[0]
+        else:
+            path = [start] + [edge[1] for edge in path_edges] if nodes else []
+        result = {
+            'algorithm': algorithm,
+            'start': start,
+            'end': end,
+            'path': path,
+            'distance': graph_tool.path_length(path) if path else None,
+            'settled': graph_tool.last_stats.get('settled', len(order)),
+            'error': None if nodes else graph_tool.last_error,
+        }
+        if algorithm in ROUTE_ALGORITHMS:
+            # The best route is path; the others follow in rank order
+            result['alternatives'] = [{'path': route, 'distance': length} for route, length in
+                                      zip(routes[1:], graph_tool.last_stats['path_lengths'][1:])] if routes else []
+        results.append(result)
+    return results
+
+
+def write_queries(results, output_format, out):
+    if output_format == "json":
+        json.dump(results, out, indent=2)
+        out.write("\n")
+        return
+    writer = csv.writer(out)
+    writer.writerow(['algorithm', 'start', 'end', 'distance', 'hops', 'settled', 'path', 'error'])
+    for result in results:
+        path = result['path']
+        writer.writerow([result['algorithm'], result['start'], result['end'],
+                         '' if result['distance'] is None else result['distance'],
+                         max(len(path) - 1, 0), result['settled'],
+                         ' '.join(map(str, path)), result['error'] or ''])
+
+
+def write_matrix(sources, targets, distances, output_format, out):
+    if output_format == "json":
+        rows = [[None if math.isinf(d) else d for d in row] for row in distances.tolist()]
+        json.dump({'sources': sources, 'targets': targets, 'distances': rows}, out, indent=2)
+        out.write("\n")
+        return
+    writer = csv.writer(out)
+    writer.writerow(['source'] + targets)
+    for source, row in zip(sources, distances.tolist()):
+        writer.writerow([source] + row)
+
+
+def write_isochrones(sources, budget, isochrones, output_format, out):
+    if output_format == "json":
+        results = [{'source': source,
+                    'budget': budget,
+                    'reached': sorted(reached.items(), key=lambda item: item[1]),
+                    'boundary': boundary}
+                   for source, (reached, boundary) in zip(sources, isochrones)]
+        json.dump(results, out, indent=2)
+        out.write("\n")
+        return
+    writer = csv.writer(out)
+    writer.writerow(['source', 'node', 'distance'])
+    for source, (reached, _) in zip(sources, isochrones):
+        for node, distance in sorted(reached.items(), key=lambda item: item[1]):
+            writer.writerow([source, node, distance])
+
+
+def write_analytics(analytics, output_format, out):
+    nodes = sorted(analytics['eccentricity'])
+    if output_format == "json":
+        json.dump({'diameter': analytics['diameter'],
+                   'radius': analytics['radius'],
+                   'nodes': [{'node': node,
+                              'eccentricity': analytics['eccentricity'][node],
+                              'betweenness': analytics['betweenness'][node]} for node in nodes]}, out, indent=2)
+        out.write("\n")
+        return
+    writer = csv.writer(out)
+    writer.writerow(['node', 'eccentricity', 'betweenness'])
+    for node in nodes:
+        writer.writerow([node, analytics['eccentricity'][node], analytics['betweenness'][node]])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run graph searches on a saved .graph file without the GUI.")
+    parser.add_argument('--profile-log', metavar='FILE',
+                        help="append a JSON line with timings and counters for every load and search to FILE")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    query = subparsers.add_parser('query', help="point-to-point searches")
+    query.add_argument('graph', help=".graph file to load")
+    query.add_argument('algorithm', choices=sorted(ALGORITHMS))
+    query.add_argument('start', type=int, nargs='?')
+    query.add_argument('end', type=int, nargs='?')
+    query.add_argument('--pairs', help="CSV file of start,end node pairs to run instead of a single query")
+    query.add_argument('--k', type=int, default=3, help="routes per query for k_shortest and alternatives")
+
+    convert = subparsers.add_parser('convert', help="convert a legacy pickled .graph file to the binary format")
+    convert.add_argument('source', help="pickled .graph file")
+    convert.add_argument('destination', help="binary .graph file to write")
+
+    batch = subparsers.add_parser('batch', help="many-to-many distance matrix")
+    batch.add_argument('graph', help=".graph file to load")
+    batch.add_argument('--sources', type=int, nargs='+', help="source nodes (default: all)")
+    batch.add_argument('--targets', type=int, nargs='+', help="target nodes (default: all)")
+    batch.add_argument('--processes', type=int, default=None, help="worker processes (default: CPU count)")
+
+    isochrone = subparsers.add_parser('isochrone', help="nodes reachable within a cost budget")
+    isochrone.add_argument('graph', help=".graph file to load")
+    isochrone.add_argument('sources', type=int, nargs='+', help="source nodes")
+    isochrone.add_argument('--budget', type=float, required=True, help="maximum path cost")
+    isochrone.add_argument('--processes', type=int, default=None, help="worker processes (default: CPU count)")
+
+    analytics = subparsers.add_parser('analytics',
+                                      help="eccentricity, diameter and betweenness from all-pairs distances")
+    analytics.add_argument('graph', help=".graph file to load")
+    analytics.add_argument('--method', choices=['auto', 'floyd_warshall', 'dijkstra'], default='auto',
+                           help="how to build the all-pairs tables")
+    analytics.add_argument('--processes', type=int, default=None, help="worker processes (default: CPU count)")
+
+    for sub in (query, batch, isochrone, analytics):
+        sub.add_argument('--format', choices=['json', 'csv'], default='json')
+        sub.add_argument('--output', help="write results to this file instead of stdout")
+
+    args = parser.parse_args(argv)
+    graph_core.profiler.log_path = args.profile_log
+
+    if args.command == 'convert':
+        graph_tool = graph_core.convert_legacy_graph(args.source, args.destination)
+        print(f"Wrote {args.destination}: {len(graph_tool.csr)} nodes, {len(graph_tool.csr.targets) // 2} edges")
+        return 0
+
+    graph_tool = graph_core.GraphTool()
+    graph_tool.load(args.graph)
+
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        if args.command == 'query':
+            if args.pairs:
+                pairs = read_pairs(args.pairs)
+            elif args.start is not None and args.end is not None:
+                pairs = [(args.start, args.end)]
+            else:
+                parser.error("query needs START and END or --pairs")
+            results = run_queries(graph_tool, args.algorithm, pairs, args.k)
+            write_queries(results, args.format, out)
+            return 1 if any(result['error'] for result in results) else 0
+
+        if args.command == 'isochrone':
+            try:
+                isochrones = graph_tool.isochrones(args.sources, args.budget, processes=args.processes)
+            except nx.NodeNotFound as e:
+                parser.error(str(e))
+            write_isochrones(args.sources, args.budget, isochrones, args.format, out)
+            return 0
+
+        if args.command == 'analytics':
+            try:
+                graph_tool.build_all_pairs(args.method, args.processes)
+            except ValueError as e:
+                parser.error(str(e))
+            write_analytics(graph_tool.analytics(), args.format, out)
+            return 0
+
+        nodes = graph_tool.csr.node_list
+        sources = args.sources or nodes
+        targets = args.targets or nodes
+        try:
+            distances = graph_tool.distance_matrix(sources, targets, processes=args.processes)
+        except nx.NodeNotFound as e:
+            parser.error(str(e))
+        write_matrix(sources, targets, distances, args.format, out)
+        return 0
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2609 @@
+import pickle
+import os
+import sys
+import mmap
+import struct
+import heapq
+import json
+import math
+import random
+import time
+import functools
+import hashlib
+import contextlib
+import threading
+import tracemalloc
+import zipfile
+import multiprocessing
+from collections import OrderedDict, deque
+from multiprocessing import shared_memory
+import networkx as nx
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Searches that find a shortest path whatever the weights, so the all-pairs
+# tables can answer them instead. The Euclidean A* variants are left out: their
+# heuristic overestimates once a weight is below the straight-line distance.
+EXACT_SEARCHES = {"shortest_path", "dijkstra", "bidirectional_dijkstra", "ch_search", "alt_search", "chain_search"}
+
+# Searches given a progress callback call it as progress(order, frontier) every
+# PROGRESS_INTERVAL settled nodes. The callback may raise SearchCancelled to
+# abandon the search; nothing is cached for a cancelled query.
+PROGRESS_INTERVAL = 256
+
+# Answered without searching, so they never report progress or cancel
+INSTANT_SEARCHES = {"lookup_path"}
+
+
+class SearchCancelled(Exception):
+    pass
+
+
+class CSRGraph:
+    # Compact array form of a GraphTool graph used by the search methods.
+    # Nodes are renumbered to contiguous indices 0..n-1 (node_ids maps an index
+    # back to the GraphTool node id), adjacency is stored as CSR offsets/targets/
+    # weights with every undirected edge present once per direction.
+    def __init__(self, node_ids, coords, offsets, targets, weights):
+        self.node_ids = node_ids
+        self.coords = coords
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.path = None  # set when the arrays are mapped from a graph file
+        self.mapping = None
+        self._node_list = None
+        self._index = None
+        self._components = None
+        # Work done by the searches on these arrays so far, for profiling
+        self.heap_pushes = 0
+        self.edges_relaxed = 0
+
+    @property
+    def node_list(self):
+        # node_ids as plain Python values (it may be a mapped NumPy array)
+        if self._node_list is None:
+            self._node_list = self.node_ids.tolist() if isinstance(self.node_ids, np.ndarray) else list(self.node_ids)
+        return self._node_list
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = {node: i for i, node in enumerate(self.node_list)}
+        return self._index
+
+    @property
+    def components(self):
+        # Connected component label (0..k-1) of every node, built on first use
+        if self._components is None:
+            self._components = self._component_labels()
+        return self._components
+
+    def _component_labels(self):
+        # Vectorized label propagation: hook every label onto the smallest
+        # label across its edges, then jump pointers until each node points at
+        # a root. A few rounds suffice even on long road networks.
+        n = len(self)
+        sources = np.repeat(np.arange(n), np.diff(self.offsets))
+        targets = np.asarray(self.targets, dtype=np.int64)
+        labels = np.arange(n)
+        while True:
+            parent = labels.copy()
+            np.minimum.at(parent, labels[sources], labels[targets])
+            while True:
+                jumped = parent[parent]
+                if np.array_equal(jumped, parent):
+                    break
+                parent = jumped
+            if np.array_equal(parent, labels):
+                break
+            labels = parent
+        return np.unique(labels, return_inverse=True)[1].astype(np.int32)
+
+    def connected(self, i, j):
+        return self.components[i] == self.components[j]
+
+    @classmethod
+    def from_graph(cls, graph, positions):
+        node_ids = list(graph.nodes)
+        index = {node: i for i, node in enumerate(node_ids)}
+        n = len(node_ids)
+
+        coords = np.zeros((n, 2), dtype=np.float64)
+        for i, node in enumerate(node_ids):
+            coords[i] = positions[node]
+
+        sources, targets, weights = [], [], []
+        for node1, node2, data in graph.edges(data=True):
+            sources.append(index[node1])
+            targets.append(index[node2])
+            weights.append(data.get('weight', 1.0))
+        return cls.from_arrays(node_ids, coords, sources, targets, weights)
+
+    @classmethod
+    def from_arrays(cls, node_ids, coords, sources, targets, weights):
+        # Build from one (source index, target index, weight) entry per
+        # undirected edge, stored here in both directions
+        n = len(node_ids)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        directed_sources = np.column_stack([sources, targets]).ravel()
+        directed_targets = np.column_stack([targets, sources]).ravel()
+
+        # Group the directed edge list by source node (stable keeps edge order)
+        order = np.argsort(directed_sources, kind='stable')
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(directed_sources, minlength=n), out=offsets[1:])
+
+        return cls(node_ids,
+                   coords,
+                   offsets,
+                   directed_targets[order].astype(np.int32),
+                   np.repeat(weights, 2)[order])
+
+    def with_edge_changes(self, changes):
+        # Copy of the graph with (i, j, weight) applied to both directions of
+        # each edge; weight inf removes the edge and a missing edge is added.
+        # Node indices are unchanged, so index-based structures stay valid.
+        weights = np.array(self.weights, dtype=np.float64)
+        keep = None
+        added = []
+        for i, j, weight in changes:
+            found = False
+            for u, v in ((i, j), (j, i)):
+                start, end = self.offsets[u], self.offsets[u + 1]
+                positions = start + np.flatnonzero(self.targets[start:end] == v)
+                found = found or len(positions) > 0
+                if math.isinf(weight):
+                    if keep is None:
+                        keep = np.ones(len(weights), dtype=bool)
+                    keep[positions] = False
+                else:
+                    weights[positions] = weight
+            if not found and not math.isinf(weight):
+                added += [(i, j, weight), (j, i, weight)]
+
+        if keep is None and not added:
+            # Same edges, so the same components
+            graph = CSRGraph(self.node_ids, self.coords, self.offsets, self.targets, weights)
+            graph._components = self._components
+            return graph
+
+        # Structural change: rebuild the rows from the directed edge list
+        n = len(self)
+        sources = np.repeat(np.arange(n), np.diff(self.offsets))
+        targets = np.asarray(self.targets)
+        if keep is not None:
+            sources, targets, weights = sources[keep], targets[keep], weights[keep]
+        if added:
+            extra = np.array(added, dtype=np.float64).reshape(-1, 3)
+            sources = np.concatenate([sources, extra[:, 0].astype(np.int64)])
+            targets = np.concatenate([targets, extra[:, 1].astype(np.int32)])
+            weights = np.concatenate([weights, extra[:, 2]])
+        order = np.argsort(sources, kind='stable')
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n), out=offsets[1:])
+        return CSRGraph(self.node_ids, self.coords, offsets,
+                        targets[order].astype(np.int32), weights[order])
+
+    def copy_arrays(self):
+        # Replace the arrays (possibly mapped from a file) by in-memory copies
+        self.node_ids, self.coords, self.offsets, self.targets, self.weights = (
+            np.array(array) if isinstance(array, np.ndarray) else array
+            for array in (self.node_ids, self.coords, self.offsets, self.targets, self.weights))
+        self.path = None
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def indices(self, *nodes):
+        try:
+            return [self.index[node] for node in nodes]
+        except KeyError as e:
+            raise nx.NodeNotFound(f"Node {e.args[0]} not in graph")
+
+    def neighbors(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.targets[start:end].tolist()
+
+    def weighted_neighbors(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return zip(self.targets[start:end].tolist(), self.weights[start:end].tolist())
+
+    def edge_weight(self, i, j):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        weights = self.weights[start:end][self.targets[start:end] == j]
+        return float(weights.min()) if len(weights) else math.inf
+
+    def distance(self, i, j):
+        # Euclidean distance between the stored node coordinates
+        x1, y1 = self.coords[i]
+        x2, y2 = self.coords[j]
+        return math.hypot(x1 - x2, y1 - y2)
+
+    def to_nodes(self, indices):
+        node_list = self.node_list
+        return [node_list[i] for i in indices]
+
+    def _walk_back(self, parent, target):
+        path = [target]
+        while parent[path[-1]] != -1:
+            path.append(parent[path[-1]])
+        path.reverse()
+        return path
+
+    def shortest_path_tree(self, source, progress=None):
+        # Full single-source Dijkstra; returns distance (inf if unreachable)
+        # and parent (-1 for the source and unreachable nodes) arrays
+        n = len(self)
+        dist = [math.inf] * n
+        parent = [-1] * n
+        settled = bytearray(n)
+        order = []
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if settled[u]:
+                continue
+            settled[u] = 1
+            if progress:
+                order.append(u)
+                if len(order) % PROGRESS_INTERVAL == 0:
+                    progress(order, [len(heap)])
+            for v, w in self.weighted_neighbors(u):
+                nd = d + w
+                if nd < dist[v]:
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd, v))
+        return np.array(dist, dtype=np.float64), np.array(parent, dtype=np.int64)
+
+    def one_to_many(self, source, targets):
+        # Dijkstra from source that stops once every target is settled. Returns
+        # the target distances (inf if unreachable) and the final parents of
+        # all settled nodes.
+        remaining = set(targets)
+        dist = {source: 0.0}
+        parent = {}  # settled node -> predecessor (-1 for the source)
+        heap = [(0.0, source, -1)]
+        while heap and remaining:
+            d, u, p = heapq.heappop(heap)
+            if u in parent:
+                continue
+            parent[u] = p
+            remaining.discard(u)
+            for v, w in self.weighted_neighbors(u):
+                nd = d + w
+                if v not in parent and nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v, u))
+        return np.array([dist[t] if t in parent else math.inf for t in targets]), parent
+
+    def isochrone(self, source, budget):
+        # Dijkstra that stops at the cost budget. Returns the reached nodes with
+        # their distances, and the boundary edges (i, j, fraction) leaving the
+        # reached set, fraction being how far along i -> j the budget lasts.
+        dist = {source: 0.0}
+        reached = {}
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > budget:
+                break
+            if u in reached:
+                continue
+            reached[u] = d
+            for v, w in self.weighted_neighbors(u):
+                nd = d + w
+                if v not in reached and nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+
+        boundary = []
+        for u, d in reached.items():
+            for v, w in self.weighted_neighbors(u):
+                if v not in reached:
+                    boundary.append((u, v, min((budget - d) / w, 1.0) if w > 0 else 1.0))
+        return reached, boundary
+
+    def restricted_search(self, source, target, heuristic=None, blocked_nodes=(), blocked_edges=(),
+                          penalties=None, max_settled=None, progress=None):
+        # A* (Dijkstra without a heuristic) that never enters blocked_nodes or
+        # uses the directed edges in blocked_edges, with the weight of edge
+        # (i, j) multiplied by penalties.get((i, j), 1). Stops after max_settled
+        # settled nodes. Returns (path, order), path None if not found.
+        dist = {source: 0.0}
+        parent = {source: -1}
+        settled = set()
+        order = []
+        heap = [(heuristic(source) if heuristic else 0.0, 0.0, source)]
+        pushes = 1
+        while heap:
+            _, d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled.add(u)
+            order.append(u)
+            if u == target:
+                self._count_work(pushes, order)
+                return self._walk_back(parent, target), order
+            if max_settled is not None and len(order) >= max_settled:
+                break
+            if progress and len(order) % PROGRESS_INTERVAL == 0:
+                progress(order, [len(dist) - len(settled)])
+            for v, w in self.weighted_neighbors(u):
+                if v in settled or v in blocked_nodes or (u, v) in blocked_edges:
+                    continue
+                nd = d + (w * penalties.get((u, v), 1.0) if penalties else w)
+                if v not in dist or nd < dist[v]:
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd + heuristic(v) if heuristic else nd, nd, v))
+                    pushes += 1
+        self._count_work(pushes, order)
+        return None, order
+
+    def seeded_search(self, seeds, targets, heuristic=None, progress=None):
+        # Dijkstra (A* with a heuristic) from several sources at once to the
+        # cheapest of several targets. seeds maps each source to its starting
+        # distance and targets maps each target to a cost added on arrival.
+        # Returns (path, order, frontier, cost), path running from a seed to a
+        # target, or None with cost inf.
+        dist = dict(seeds)
+        parent = dict.fromkeys(seeds, -1)
+        settled = set()
+        order, frontier = [], []
+        heap = [(d + heuristic(v) if heuristic else d, d, v) for v, d in seeds.items()]
+        heapq.heapify(heap)
+        pushes = len(heap)
+        best, reached = math.inf, None
+        while heap and heap[0][0] < best:
+            _, d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled.add(u)
+            order.append(u)
+            if u in targets and d + targets[u] < best:
+                best, reached = d + targets[u], u
+            for v, w in self.weighted_neighbors(u):
+                if v in settled:
+                    continue
+                nd = d + w
+                if v not in dist or nd < dist[v]:
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd + heuristic(v) if heuristic else nd, nd, v))
+                    pushes += 1
+            frontier.append(len(dist) - len(settled))
+            if progress and len(order) % PROGRESS_INTERVAL == 0:
+                progress(order, frontier)
+        self._count_work(pushes, order)
+        if reached is None:
+            return None, order, frontier, math.inf
+        return self._walk_back(parent, reached), order, frontier, best
+
+    def path_cost(self, path):
+        return sum(self.edge_weight(i, j) for i, j in zip(path, path[1:]))
+
+    def _out_degree_sum(self, nodes):
+        nodes = np.asarray(nodes, dtype=np.int64)
+        return int((self.offsets[nodes + 1] - self.offsets[nodes]).sum())
+
+    def _count_work(self, pushes, settled):
+        # Every edge out of a settled node gets relaxed (or skipped) once
+        self.heap_pushes += pushes
+        self.edges_relaxed += self._out_degree_sum(settled)
+
+    # The searches below make a single pass and return (path, order, frontier),
+    # where order is the sequence in which nodes were settled/expanded and
+    # frontier[k] is the number of open nodes right after order[k] was expanded.
+    # path is None when the target cannot be reached. All of them take an
+    # optional progress callback, see PROGRESS_INTERVAL.
+
+    def dijkstra_search(self, source, target, heuristic=None, progress=None):
+        # Heap-based Dijkstra; with a heuristic this is A*
+        dist = {source: 0.0}
+        parent = {source: -1}
+        settled = set()
+        order, frontier = [], []
+        heap = [(heuristic(source) if heuristic else 0.0, 0.0, source)]
+        pushes = 1
+        while heap:
+            _, d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled.add(u)
+            order.append(u)
+            if u == target:
+                frontier.append(len(dist) - len(settled))
+                self._count_work(pushes, order)
+                return self._walk_back(parent, target), order, frontier
+            for v, w in self.weighted_neighbors(u):
+                if v in settled:
+                    continue
+                nd = d + w
+                if v not in dist or nd < dist[v]:
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd + heuristic(v) if heuristic else nd, nd, v))
+                    pushes += 1
+            frontier.append(len(dist) - len(settled))
+            if progress and len(order) % PROGRESS_INTERVAL == 0:
+                progress(order, frontier)
+        self._count_work(pushes, order)
+        return None, order, frontier
+
+    def bfs_search(self, source, target, progress=None):
+        # Fewest-hops search, ignoring weights
+        parent = {source: -1}
+        queue = deque([source])
+        order, frontier = [], []
+        while queue:
+            u = queue.popleft()
+            order.append(u)
+            if u == target:
+                frontier.append(len(queue))
+                self._count_work(0, order)
+                return self._walk_back(parent, target), order, frontier
+            for v in self.neighbors(u):
+                if v not in parent:
+                    parent[v] = u
+                    queue.append(v)
+            frontier.append(len(queue))
+            if progress and len(order) % PROGRESS_INTERVAL == 0:
+                progress(order, frontier)
+        self._count_work(0, order)
+        return None, order, frontier
+
+    def dfs_search(self, source, target, progress=None):
+        # Depth-first search; the returned path is the DFS tree branch to target
+        parent = {source: -1}
+        order, frontier = [source], [1]
+        if source == target:
+            return [source], order, frontier
+        stack = [(source, iter(self.neighbors(source)))]
+        while stack:
+            u, children = stack[-1]
+            for v in children:
+                if v not in parent:
+                    parent[v] = u
+                    order.append(v)
+                    if v == target:
+                        frontier.append(len(stack))
+                        self._count_work(0, order)
+                        return self._walk_back(parent, target), order, frontier
+                    stack.append((v, iter(self.neighbors(v))))
+                    frontier.append(len(stack))
+                    if progress and len(order) % PROGRESS_INTERVAL == 0:
+                        progress(order, frontier)
+                    break
+            else:
+                stack.pop()
+        self._count_work(0, order)
+        return None, order, frontier
+
+    def bidirectional_search(self, source, target, potential=None, progress=None):
+        # Bidirectional Dijkstra; with a potential p this is bidirectional A*,
+        # keyed on d + p(v) forward and d - p(v) backward. Returns an extra
+        # sides list telling which search (0 forward, 1 backward) settled order[k].
+        if source == target:
+            return [source], [source], [0], [0]
+
+        dist = ({source: 0.0}, {target: 0.0})
+        parent = ({source: -1}, {target: -1})
+        settled = (set(), set())
+        sign = (1.0, -1.0)
+
+        def key(side, v, d):
+            return d + sign[side] * potential(v) if potential else d
+
+        heaps = ([(key(0, source, 0.0), 0.0, source)], [(key(1, target, 0.0), 0.0, target)])
+        order, frontier, sides = [], [], []
+        best, meet = math.inf, None
+        pushes = 2
+        while heaps[0] and heaps[1]:
+            # No unsettled node can lie on a path shorter than the best meeting
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+
+            # Expand the side with the smaller open set
+            open_sizes = [len(dist[i]) - len(settled[i]) for i in (0, 1)]
+            side = 0 if open_sizes[0] <= open_sizes[1] else 1
+            other = 1 - side
+            _, d, u = heapq.heappop(heaps[side])
+            if u in settled[side]:
+                continue
+            settled[side].add(u)
+            order.append(u)
+            sides.append(side)
+            if u in dist[other] and d + dist[other][u] < best:
+                best, meet = d + dist[other][u], u
+
+            for v, w in self.weighted_neighbors(u):
+                if v in settled[side]:
+                    continue
+                nd = d + w
+                if v not in dist[side] or nd < dist[side][v]:
+                    dist[side][v] = nd
+                    parent[side][v] = u
+                    heapq.heappush(heaps[side], (key(side, v, nd), nd, v))
+                    pushes += 1
+                if v in dist[other] and dist[side][v] + dist[other][v] < best:
+                    best, meet = dist[side][v] + dist[other][v], v
+            frontier.append(len(dist[0]) - len(settled[0]) + len(dist[1]) - len(settled[1]))
+            if progress and len(order) % PROGRESS_INTERVAL == 0:
+                progress(order, frontier)
+
+        self._count_work(pushes, order)
+        if meet is None:
+            return None, order, frontier, sides
+        forward = self._walk_back(parent[0], meet)
+        backward = self._walk_back(parent[1], meet)
+        return forward + backward[-2::-1], order, frontier, sides
+
+
+# Binary graph file, replacing the pickled (nx.Graph, positions, current_node)
+# tuple. A fixed header is followed by flat little-endian arrays, each starting
+# on a 64 byte boundary so they can be mapped straight into NumPy:
+#
+#   magic "PFVGRAPH", format version, flags, node count, directed edge count,
+#   next node id, then the byte offset of each section below
+#   node_ids  int64[n]      GraphTool node id of every CSR index
+#   coords    float64[n, 2] node positions
+#   offsets   int64[n + 1]  CSR row offsets
+#   targets   int32[m]      CSR neighbor indices
+#   weights   float64[m]    CSR edge weights
+GRAPH_MAGIC = b"PFVGRAPH"
+GRAPH_FORMAT_VERSION = 1
+_GRAPH_HEADER = struct.Struct("<8sIIqqq5q")
+_GRAPH_SECTIONS = (
+    ('node_ids', '<i8'),
+    ('coords', '<f8'),
+    ('offsets', '<i8'),
+    ('targets', '<i4'),
+    ('weights', '<f8'),
+)
+
+
+def is_graph_file(filename):
+    with open(filename, 'rb') as f:
+        return f.read(len(GRAPH_MAGIC)) == GRAPH_MAGIC
+
+
+def write_graph_file(filename, csr, next_node):
+    arrays = {
+        'node_ids': np.asarray(csr.node_list, dtype='<i8'),
+        'coords': np.ascontiguousarray(csr.coords, dtype='<f8'),
+        'offsets': np.ascontiguousarray(csr.offsets, dtype='<i8'),
+        'targets': np.ascontiguousarray(csr.targets, dtype='<i4'),
+        'weights': np.ascontiguousarray(csr.weights, dtype='<f8'),
+    }
+    positions = []
+    position = _GRAPH_HEADER.size
+    for name, _ in _GRAPH_SECTIONS:
+        position = (position + 63) // 64 * 64
+        positions.append(position)
+        position += arrays[name].nbytes
+
+    header = _GRAPH_HEADER.pack(GRAPH_MAGIC, GRAPH_FORMAT_VERSION, 0,
+                                len(csr), len(csr.targets), next_node, *positions)
+    with open(filename, 'wb') as f:
+        f.write(header)
+        for (name, _), position in zip(_GRAPH_SECTIONS, positions):
+            f.write(b"\0" * (position - f.tell()))
+            f.write(arrays[name].tobytes())
+
+
+def read_graph_file(filename, use_mmap=True):
+    # Returns (CSRGraph, next node id). With use_mmap the arrays are read-only
+    # views of the mapped file: nothing is copied, and processes that open the
+    # same file share its pages. The mapping is kept as csr.mapping so it can
+    # be closed before the file is replaced.
+    with open(filename, 'rb') as f:
+        if use_mmap:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buffer = f.read()
+
+    if len(buffer) < _GRAPH_HEADER.size:
+        raise ValueError(f"{filename} is not a graph file")
+    magic, version, _, n, m, next_node, *positions = _GRAPH_HEADER.unpack_from(buffer)
+    if magic != GRAPH_MAGIC:
+        raise ValueError(f"{filename} is not a graph file")
+    if version > GRAPH_FORMAT_VERSION:
+        raise ValueError(f"Unsupported graph file version {version} (newest supported is {GRAPH_FORMAT_VERSION})")
+
+    counts = {'node_ids': n, 'coords': 2 * n, 'offsets': n + 1, 'targets': m, 'weights': m}
+    arrays = {
+        name: np.frombuffer(buffer, dtype=dtype, count=counts[name], offset=position)
+        for (name, dtype), position in zip(_GRAPH_SECTIONS, positions)
+    }
+    csr = CSRGraph(arrays['node_ids'], arrays['coords'].reshape(n, 2), arrays['offsets'],
+                   arrays['targets'], arrays['weights'])
+    if use_mmap:
+        csr.path = os.path.abspath(filename)
+        csr.mapping = buffer
+    return csr, next_node
+
+
+def convert_legacy_graph(source, destination):
+    # Convert a pickled (nx.Graph, positions, current_node) .graph file
+    graph_tool = GraphTool()
+    graph_tool.load(source)
+    graph_tool.save(destination)  # closes any mapping of destination first
+    return graph_tool
+
+
+# Batch many-to-many queries. Workers map the graph file the CSR arrays came
+# from or, for graphs built in memory, a copy of the arrays placed in shared
+# memory; either way they read them in place instead of receiving a pickled
+# copy of the graph.
+_batch_csr = None
+
+
+def _share_array(array, blocks):
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    blocks.append(block)
+    return block.name, array.shape, array.dtype.str
+
+
+def _batch_worker_init(specs):
+    global _batch_csr
+    if isinstance(specs, str):
+        _batch_csr, _ = read_graph_file(specs)
+        return
+    arrays, blocks = [], []
+    for name, shape, dtype in specs:
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)  # keep the mappings alive for the worker's lifetime
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array.flags.writeable = False
+        arrays.append(array)
+    offsets, targets, weights = arrays
+    n = len(offsets) - 1
+    _batch_csr = CSRGraph(range(n), np.zeros((0, 2)), offsets, targets, weights)
+    _batch_csr.shared_blocks = blocks
+
+
+def _batch_rows(csr, sources, targets, return_predecessors):
+    distances = np.empty((len(sources), len(targets)))
+    predecessors = np.full((len(sources), len(csr)), -1, dtype=np.int64) if return_predecessors else None
+    for row, source in enumerate(sources):
+        distances[row], parent = csr.one_to_many(source, targets)
+        if return_predecessors:
+            settled = np.fromiter(parent.keys(), dtype=np.int64, count=len(parent))
+            predecessors[row, settled] = np.fromiter(parent.values(), dtype=np.int64, count=len(parent))
+    return distances, predecessors
+
+
+def _batch_worker_rows(args):
+    return _batch_rows(_batch_csr, *args)
+
+
+def _batch_isochrones(csr, sources, budget):
+    return [csr.isochrone(source, budget) for source in sources]
+
+
+def _batch_worker_isochrones(args):
+    return _batch_isochrones(_batch_csr, *args)
+
+
+def _batch_map(csr, worker, sources, args, processes):
+    # Split sources into chunks and run worker((chunk, *args)) over a process
+    # pool that shares the CSR arrays; returns the per-chunk results in order
+    chunk = max(1, math.ceil(len(sources) / (processes * 4)))
+    chunks = [sources[i:i + chunk] for i in range(0, len(sources), chunk)]
+    blocks = []
+    try:
+        if csr.path:
+            specs = csr.path
+        else:
+            specs = [_share_array(array, blocks) for array in (csr.offsets, csr.targets, csr.weights)]
+        with multiprocessing.Pool(min(processes, len(chunks)), _batch_worker_init, (specs,)) as pool:
+            return pool.map(worker, [(part, *args) for part in chunks])
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def batch_distance_matrix(csr, sources, targets, processes=None, return_predecessors=False):
+    # sources/targets are CSR indices. Returns a len(sources) x len(targets)
+    # distance matrix (inf where unreachable) and, if requested, a
+    # len(sources) x len(csr) matrix of CSR predecessor indices (-1 for none).
+    sources, targets = list(sources), list(targets)
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(sources) < 2:
+        return _batch_rows(csr, sources, targets, return_predecessors)
+
+    results = _batch_map(csr, _batch_worker_rows, sources, (targets, return_predecessors), processes)
+    distances = np.vstack([rows for rows, _ in results])
+    predecessors = np.vstack([rows for _, rows in results]) if return_predecessors else None
+    return distances, predecessors
+
+
+def batch_isochrones(csr, sources, budget, processes=None):
+    # CSRGraph.isochrone for every source (CSR indices), in parallel when
+    # there are several; returns the (reached, boundary) pairs in order
+    sources = list(sources)
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(sources) < 2:
+        return _batch_isochrones(csr, sources, budget)
+    results = _batch_map(csr, _batch_worker_isochrones, sources, (budget,), processes)
+    return [isochrone for part in results for isochrone in part]
+
+
+class AllPairs:
+    # Shortest distances and paths between every pair of nodes, for graphs
+    # small enough to keep n x n tables, plus the analytics read off them.
+    # predecessors[s, v] is the node before v on a shortest s -> v path (-1
+    # when v is s or unreachable). Everything is in CSR indices.
+    floyd_warshall_limit = 500  # larger graphs use repeated Dijkstra
+    block = 64
+
+    def __init__(self, csr, distances, predecessors):
+        self.csr = csr
+        self.distances = distances
+        self.predecessors = predecessors
+        self._betweenness = None
+
+    @classmethod
+    def build(cls, csr, method="auto", processes=None, progress=None):
+        # progress, if given, sees the finished pivots or sources as the
+        # settled order; the Dijkstra rows are then computed a slice at a time
+        # so a cancel does not wait for the whole table
+        if method == "auto":
+            method = "floyd_warshall" if len(csr) <= cls.floyd_warshall_limit else "dijkstra"
+        if method == "floyd_warshall":
+            return cls(csr, *cls._floyd_warshall(csr, cls.block, progress))
+        if method != "dijkstra":
+            raise ValueError(f"Unknown all-pairs method: {method}")
+        n = len(csr)
+        step = max(PROGRESS_INTERVAL, math.ceil(n / 10)) if progress else max(n, 1)
+        parts = []
+        for start in range(0, n, step):
+            end = min(start + step, n)
+            parts.append(batch_distance_matrix(csr, range(start, end), range(n), processes, return_predecessors=True))
+            if progress:
+                progress(range(end), [n - end])
+        distances = np.vstack([part[0] for part in parts]) if parts else np.zeros((0, 0))
+        predecessors = np.vstack([part[1] for part in parts]) if parts else np.zeros((0, 0))
+        return cls(csr, distances, predecessors.astype(np.int32))
+
+    @staticmethod
+    def _floyd_warshall(csr, block, progress=None):
+        # In-place Floyd-Warshall, each pivot applied to block rows at a time
+        # so the temporaries stay in cache
+        n = len(csr)
+        sources = np.repeat(np.arange(n), np.diff(csr.offsets))
+        distances = np.full((n, n), np.inf)
+        np.minimum.at(distances, (sources, csr.targets), csr.weights)
+        np.fill_diagonal(distances, 0.0)
+        predecessors = np.where(np.isfinite(distances), np.arange(n, dtype=np.int32)[:, None], -1).astype(np.int32)
+        np.fill_diagonal(predecessors, -1)
+
+        candidate = np.empty((min(block, n), n))
+        better = np.empty((min(block, n), n), dtype=bool)
+        for k in range(n):
+            row, predecessor_row = distances[k], predecessors[k]
+            for start in range(0, n, block):
+                end = min(start + block, n)
+                rows, shorter = candidate[:end - start], better[:end - start]
+                np.add(distances[start:end, k, None], row, out=rows)
+                np.less(rows, distances[start:end], out=shorter)
+                np.copyto(distances[start:end], rows, where=shorter)
+                np.copyto(predecessors[start:end], predecessor_row, where=shorter)
+            if progress and (k + 1) % PROGRESS_INTERVAL == 0:
+                progress(range(k + 1), [n - k - 1])
+        return distances, predecessors
+
+    def path(self, source, target):
+        # Shortest path as CSR indices, None if unreachable
+        if math.isinf(self.distances[source, target]):
+            return None
+        path = [target]
+        while path[-1] != source:
+            path.append(int(self.predecessors[source, path[-1]]))
+        path.reverse()
+        return path
+
+    def eccentricity(self):
+        # Largest distance from each node to a node it can reach
+        if not len(self.distances):
+            return np.zeros(0)
+        return np.where(np.isfinite(self.distances), self.distances, 0.0).max(axis=1)
+
+    def betweenness(self, progress=None):
+        # Brandes' algorithm run for all sources at once: one step per rank
+        # of distance from the source counts shortest paths (sigma) forward,
+        # and the reverse pass accumulates dependencies (delta). In-edges are
+        # padded to the largest degree, padding pointing at an extra column.
+        # Normalized like networkx, by (n - 1)(n - 2). progress, if given,
+        # sees the finished steps of the current pass as the settled order.
+        if self._betweenness is not None:
+            return self._betweenness
+        csr, n = self.csr, len(self.csr)
+        degree = np.diff(csr.offsets)
+        width = int(degree.max(initial=0))
+        neighbors = np.full((n, width), n, dtype=np.int64)
+        neighbor_weights = np.full((n, width), np.inf)
+        rows = np.repeat(np.arange(n), degree)
+        slots = np.arange(len(csr.targets)) - np.repeat(csr.offsets[:-1], degree)
+        neighbors[rows, slots] = csr.targets
+        neighbor_weights[rows, slots] = csr.weights
+
+        distances = np.hstack([self.distances, np.full((n, 1), np.inf)])
+        finite = distances[np.isfinite(distances)]
+        tolerance = 1e-9 * max(1.0, float(finite.max(initial=0.0)))
+        order = np.argsort(self.distances, axis=1, kind='stable')
+        sources = np.arange(n)
+        source_rows = sources[:, None]
+
+        def advance(done, total):
+            if progress and done % PROGRESS_INTERVAL == 0:
+                progress(range(done), [total - done])
+
+        def tight(v):
+            # Which in-edges of v (per source) lie on a shortest path to it
+            near = neighbors[v]
+            with np.errstate(invalid='ignore'):
+                on_path = np.abs(distances[source_rows, near] + neighbor_weights[v]
+                                 - distances[sources, v][:, None]) <= tolerance
+            return near, on_path
+
+        # A zero-weight edge is tight both ways, a cycle no rank order can
+        # follow. Such edges then only count from the end fewer hops from the
+        # source, so ties in distance are ranked by hop count.
+        hops = None
+        if (csr.weights <= tolerance).any():
+            hops = np.full((n, n + 1), np.inf)
+            hops[sources, sources] = 0.0
+            changed = True
+            while changed:
+                changed = False
+                for rank in range(n):
+                    advance(rank, n)
+                    v = order[:, rank]
+                    near, on_path = tight(v)
+                    fewer = np.where(on_path, hops[source_rows, near] + 1.0, np.inf).min(axis=1, initial=np.inf)
+                    fewer = np.minimum(fewer, hops[sources, v])
+                    changed |= bool((fewer < hops[sources, v]).any())
+                    hops[sources, v] = fewer
+            order = np.lexsort((hops[:, :n], self.distances), axis=1)
+            plain_tight = tight
+
+            def tight(v):
+                near, on_path = plain_tight(v)
+                with np.errstate(invalid='ignore'):
+                    ahead = ((distances[source_rows, near] < distances[sources, v][:, None] - tolerance)
+                             | (hops[source_rows, near] < hops[sources, v][:, None]))
+                return near, on_path & ahead
+
+        sigma = np.zeros((n, n + 1))
+        sigma[sources, sources] = 1.0
+        for rank in range(1, n):
+            advance(rank, 2 * n)
+            v = order[:, rank]
+            near, on_path = tight(v)
+            sigma[sources, v] = np.where(on_path, sigma[source_rows, near], 0.0).sum(axis=1)
+
+        delta = np.zeros((n, n + 1))
+        for rank in range(n - 1, 0, -1):
+            advance(2 * n - rank, 2 * n)
+            v = order[:, rank]
+            near, on_path = tight(v)
+            share = np.divide(1.0 + delta[sources, v], sigma[sources, v],
+                              out=np.zeros(n), where=sigma[sources, v] > 0)
+            delta[source_rows, near] += np.where(on_path, sigma[source_rows, near] * share[:, None], 0.0)
+
+        totals = delta[:, :n].sum(axis=0) - delta[sources, sources]
+        self._betweenness = totals / ((n - 1) * (n - 2)) if n > 2 else totals * 0.0
+        return self._betweenness
+
+
+class Landmarks:
+    # ALT (A*, landmarks, triangle inequality) lower bounds. distances is an
+    # (n, k) array of shortest distances from every node to each landmark, with
+    # unreachable entries stored as 0 so they never contribute to a bound.
+    def __init__(self, landmarks, distances):
+        self.landmarks = landmarks
+        self.distances = distances
+
+    @staticmethod
+    def _lower_bounds(distances, source):
+        # Best triangle-inequality bound from source to every node
+        if distances.shape[1] == 0:
+            return np.zeros(distances.shape[0])
+        return np.abs(distances - distances[source]).max(axis=1)
+
+    @classmethod
+    def _avoid_candidate(cls, csr, landmarks, distances, rng, progress=None):
+        # Goldberg-Harrelson "avoid": grow a shortest path tree from a random
+        # root and descend into the subtree whose nodes are worst covered by the
+        # current landmarks, taking the leaf it ends in
+        root = rng.randrange(len(csr))
+        dist, parent = csr.shortest_path_tree(root, progress)
+        reached = np.isfinite(dist)
+        size = np.where(reached, dist - cls._lower_bounds(distances, root), 0.0)
+        has_landmark = np.zeros(len(csr), dtype=bool)
+        has_landmark[landmarks] = True
+
+        children = {}
+        for v in np.argsort(-np.where(reached, dist, -1.0)).tolist():
+            p = parent[v]
+            if not reached[v] or p < 0:
+                continue
+            children.setdefault(p, []).append(v)
+            if has_landmark[v]:
+                has_landmark[p] = True
+            else:
+                size[p] += size[v]
+        size[has_landmark] = 0.0
+
+        node = root
+        while True:
+            best = max(children.get(node, []), key=lambda v: size[v], default=None)
+            if best is None or size[best] <= 0:
+                break
+            node = best
+        if node in landmarks:
+            return None
+        return node
+
+    @classmethod
+    def select(cls, csr, count=8, strategy="farthest", seed=0, progress=None):
+        # progress, if given, sees the landmarks chosen so far as the settled
+        # order; it is also called during each shortest path tree, so a cancel
+        # does not wait for the tree to finish
+        if strategy not in ("farthest", "avoid"):
+            raise ValueError(f"Unknown landmark strategy: {strategy}")
+        rng = random.Random(seed)
+        n = len(csr)
+        landmarks, columns = [], []
+        closest = None  # distance from every node to its nearest landmark
+        report = progress and (lambda order, frontier: progress(landmarks, [min(count, n) - len(landmarks)]))
+
+        while len(landmarks) < min(count, n):
+            candidate = None
+            if strategy == "avoid" and landmarks:
+                candidate = cls._avoid_candidate(csr, landmarks, np.column_stack(columns), rng, report)
+            if candidate is None:
+                # Farthest: the node worst served by the current landmarks (nodes
+                # none of them reach come first, covering other components)
+                if closest is None:
+                    far, _ = csr.shortest_path_tree(rng.randrange(n), report)
+                else:
+                    far = closest.copy()
+                far[landmarks] = -1.0
+                candidate = int(np.argmax(far))
+                if far[candidate] <= 0:
+                    break
+
+            column, _ = csr.shortest_path_tree(candidate, report)
+            landmarks.append(candidate)
+            columns.append(np.where(np.isfinite(column), column, 0.0))
+            closest = column if closest is None else np.minimum(closest, column)
+            if progress:
+                report(landmarks, [])
+
+        distances = np.column_stack(columns) if columns else np.zeros((n, 0))
+        return cls(np.array(landmarks, dtype=np.int64), distances)
+
+    def heuristic(self, target):
+        distances = self.distances
+        to_target = distances[target]
+
+        def heuristic(i):
+            return float(np.abs(to_target - distances[i]).max(initial=0.0))
+        return heuristic
+
+
+class ContractionHierarchy:
+    # Contraction Hierarchies over a CSRGraph. Nodes are contracted one by one
+    # (cheapest edge difference first) and shortcuts are added where no witness
+    # path exists. Only upward edges (towards higher rank) are kept, as CSR
+    # arrays; up_middle[e] is the contracted node a shortcut bypasses, or -1 for
+    # an original edge.
+    def __init__(self, node_ids, signature, rank, up_offsets, up_targets, up_weights, up_middle):
+        self.node_ids = node_ids
+        self.signature = signature
+        self.rank = rank
+        self.up_offsets = up_offsets
+        self.up_targets = up_targets
+        self.up_weights = up_weights
+        self.up_middle = up_middle
+        # Work done by the queries so far, for profiling
+        self.heap_pushes = 0
+        self.edges_relaxed = 0
+
+    @staticmethod
+    def _signature(csr):
+        # Content hash of the arrays the hierarchy was built from; any edit,
+        # even one keeping the edge count and weight total, changes it
+        digest = hashlib.sha256()
+        for array, dtype in ((csr.node_ids, '<i8'), (csr.offsets, '<i8'), (csr.targets, '<i4'), (csr.weights, '<f8')):
+            digest.update(np.ascontiguousarray(array, dtype=dtype).tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _witness_distances(adj, source, excluded, max_dist, settle_limit):
+        # Local Dijkstra that ignores the node being contracted
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        settled = 0
+        while heap and settled < settle_limit:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if d > max_dist:
+                break
+            settled += 1
+            for v, (w, _) in adj[u].items():
+                if v == excluded:
+                    continue
+                nd = d + w
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return dist
+
+    @classmethod
+    def _shortcuts(cls, adj, v, settle_limit):
+        # Shortcuts needed to remove v without changing any shortest distance
+        neighbors = list(adj[v].items())
+        shortcuts = []
+        for k, (u, (w_u, _)) in enumerate(neighbors[:-1]):
+            rest = neighbors[k + 1:]
+            max_dist = w_u + max(w for _, (w, _) in rest)
+            dist = cls._witness_distances(adj, u, v, max_dist, settle_limit)
+            for x, (w_x, _) in rest:
+                if dist.get(x, math.inf) > w_u + w_x:
+                    shortcuts.append((u, x, w_u + w_x))
+        return shortcuts
+
+    @classmethod
+    def build(cls, csr, settle_limit=50, progress=None):
+        # progress, if given, sees the contracted nodes as the settled order
+        n = len(csr)
+        adj = [dict() for _ in range(n)]
+        for u in range(n):
+            for v, w in csr.weighted_neighbors(u):
+                if u != v and (v not in adj[u] or w < adj[u][v][0]):
+                    adj[u][v] = (w, -1)
+
+        deleted_neighbors = [0] * n
+
+        def priority(v):
+            return len(cls._shortcuts(adj, v, settle_limit)) - len(adj[v]) + deleted_neighbors[v]
+
+        heap = [(priority(v), v) for v in range(n)]
+        heapq.heapify(heap)
+        rank = np.full(n, -1, dtype=np.int64)
+        upward = [None] * n
+        next_rank = 0
+        contracted = []
+        while heap:
+            _, v = heapq.heappop(heap)
+            if rank[v] >= 0:
+                continue
+            # Lazy update: re-evaluate and defer v if it is no longer the cheapest
+            current = priority(v)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, v))
+                continue
+
+            for u, x, weight in cls._shortcuts(adj, v, settle_limit):
+                if x not in adj[u] or weight < adj[u][x][0]:
+                    adj[u][x] = (weight, v)
+                    adj[x][u] = (weight, v)
+
+            rank[v] = next_rank
+            next_rank += 1
+            if progress:
+                contracted.append(v)
+                if next_rank % PROGRESS_INTERVAL == 0:
+                    progress(contracted, [n - next_rank])
+            upward[v] = adj[v]
+            for u in adj[v]:
+                del adj[u][v]
+                deleted_neighbors[u] += 1
+            adj[v] = {}
+
+        counts = np.array([len(edges) for edges in upward], dtype=np.int64)
+        up_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(counts, out=up_offsets[1:])
+        up_targets = np.array([u for edges in upward for u in edges], dtype=np.int32)
+        up_weights = np.array([w for edges in upward for w, _ in edges.values()], dtype=np.float64)
+        up_middle = np.array([m for edges in upward for _, m in edges.values()], dtype=np.int32)
+        # A copy: the hierarchy can outlive a mapping the node ids come from
+        return cls(np.array(csr.node_ids), cls._signature(csr), rank,
+                   up_offsets, up_targets, up_weights, up_middle)
+
+    @staticmethod
+    def path_for(graph_path):
+        # The hierarchy lives next to the .graph file it was built from
+        return os.path.splitext(graph_path)[0] + ".ch.npz"
+
+    def save(self, graph_path):
+        np.savez_compressed(self.path_for(graph_path),
+                            node_ids=self.node_ids, signature=self.signature, rank=self.rank,
+                            up_offsets=self.up_offsets, up_targets=self.up_targets,
+                            up_weights=self.up_weights, up_middle=self.up_middle)
+
+    @classmethod
+    def load(cls, graph_path):
+        with np.load(cls.path_for(graph_path)) as data:
+            return cls(data['node_ids'], str(data['signature']), data['rank'], data['up_offsets'],
+                       data['up_targets'], data['up_weights'], data['up_middle'])
+
+    def matches(self, csr):
+        # A saved hierarchy is only usable for the exact graph it was built from
+        return (len(self.node_ids) == len(csr)
+                and np.array_equal(self.node_ids, np.asarray(csr.node_ids))
+                and self.signature == self._signature(csr))
+
+    def _upward_edges(self, u):
+        start, end = self.up_offsets[u], self.up_offsets[u + 1]
+        return zip(range(start, end), self.up_targets[start:end].tolist(), self.up_weights[start:end].tolist())
+
+    def _edge_index(self, u, v):
+        start, end = self.up_offsets[u], self.up_offsets[u + 1]
+        return start + self.up_targets[start:end].tolist().index(v)
+
+    def _unpack(self, u, v, edge, path):
+        # Append the original nodes after u on edge u-v, expanding shortcuts
+        stack = [(u, v, edge)]
+        while stack:
+            a, b, e = stack.pop()
+            middle = self.up_middle[e]
+            if middle < 0:
+                path.append(b)
+                continue
+            # Both halves of a shortcut are upward edges out of the bypassed node
+            stack.append((middle, b, self._edge_index(middle, b)))
+            stack.append((a, middle, self._edge_index(middle, a)))
+
+    def query(self, source, target, progress=None):
+        # Bidirectional Dijkstra restricted to upward edges. Same result shape
+        # as CSRGraph.bidirectional_search.
+        dist = ({source: 0.0}, {target: 0.0})
+        parent = ({source: (-1, -1)}, {target: (-1, -1)})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        settled = (set(), set())
+        order, frontier, sides = [], [], []
+        best, meet = math.inf, None
+        side = 0
+        pushes = 2
+        while heaps[0] or heaps[1]:
+            if not heaps[side]:
+                side = 1 - side
+            d, u = heapq.heappop(heaps[side])
+            if u in settled[side]:
+                continue
+            if d >= best:
+                # Nothing left on this side can improve the meeting distance
+                heaps[side].clear()
+                side = 1 - side
+                continue
+            settled[side].add(u)
+            order.append(u)
+            sides.append(side)
+            other = dist[1 - side]
+            if u in other and d + other[u] < best:
+                best, meet = d + other[u], u
+
+            for e, v, w in self._upward_edges(u):
+                nd = d + w
+                if nd < dist[side].get(v, math.inf):
+                    dist[side][v] = nd
+                    parent[side][v] = (u, e)
+                    heapq.heappush(heaps[side], (nd, v))
+                    pushes += 1
+            frontier.append(len(dist[0]) - len(settled[0]) + len(dist[1]) - len(settled[1]))
+            if progress and len(order) % PROGRESS_INTERVAL == 0:
+                progress(order, frontier)
+            side = 1 - side
+
+        self.heap_pushes += pushes
+        settled = np.asarray(order, dtype=np.int64)
+        self.edges_relaxed += int((self.up_offsets[settled + 1] - self.up_offsets[settled]).sum())
+        if meet is None:
+            return None, order, frontier, sides
+
+        edges = []
+        node = meet
+        while parent[0][node][0] != -1:
+            previous, e = parent[0][node]
+            edges.append((previous, node, e))
+            node = previous
+        edges.reverse()
+        node = meet
+        while parent[1][node][0] != -1:
+            previous, e = parent[1][node]
+            edges.append((node, previous, e))
+            node = previous
+
+        path = [source]
+        for u, v, e in edges:
+            self._unpack(u, v, e, path)
+        return path, order, frontier, sides
+
+
+class ChainCompression:
+    # Search graph with degree-2 chains contracted. Nodes with exactly two
+    # distinct neighbors are dropped and each chain of them becomes one
+    # super-edge between the kept nodes at its ends, weighted with the chain
+    # length. graph is a CSRGraph over the kept nodes. chains[c] is (start,
+    # end, interior nodes from start to end, length) in full CSR indices, and
+    # links maps a kept pair (a, b) to (length, c) for the cheapest chain
+    # between them, unless an original edge is at least as cheap.
+    def __init__(self, kept, graph, chains, links, chain_of, position, along):
+        self.kept = kept
+        self.kept_list = kept.tolist()
+        self.compressed = np.full(len(chain_of), -1, dtype=np.int64)
+        self.compressed[kept] = np.arange(len(kept))
+        self.graph = graph
+        self.chains = chains
+        self.links = links
+        self.chain_of = chain_of  # chain of every interior node, -1 if kept
+        self.position = position  # index in its chain's interior nodes
+        self.along = along  # distance from its chain's start
+
+    @classmethod
+    def build(cls, csr, progress=None):
+        # progress, if given, sees the interior nodes folded into chains so far
+        # as the settled order
+        n = len(csr)
+        offsets = np.asarray(csr.offsets)
+        targets = np.asarray(csr.targets)
+        weights = np.asarray(csr.weights)
+        nodes = np.arange(n)
+        interior = np.diff(offsets) == 2
+        if len(targets):
+            first = targets[np.minimum(offsets[:-1], len(targets) - 1)]
+            second = targets[np.minimum(offsets[:-1] + 1, len(targets) - 1)]
+            interior &= (first != second) & (first != nodes) & (second != nodes)
+
+        chain_of = np.full(n, -1, dtype=np.int64)
+        position = np.zeros(n, dtype=np.int64)
+        along = np.zeros(n, dtype=np.float64)
+        chains, links = [], {}
+        folded, total = [], int(interior.sum())
+
+        def walk(u, v, length):
+            # Follow the chain entered by edge u -> v up to the next kept node
+            c, interior_nodes, previous = len(chains), [], u
+            while interior[v]:
+                chain_of[v], position[v], along[v] = c, len(interior_nodes), length
+                interior_nodes.append(v)
+                start = offsets[v]
+                step = 1 if targets[start] == previous else 0
+                previous, v = v, int(targets[start + step])
+                length += float(weights[start + step])
+            chains.append((u, v, interior_nodes, length))
+            if u != v and length < links.get((u, v), (math.inf,))[0]:
+                links[u, v] = links[v, u] = (length, c)
+            if progress:
+                folded.extend(interior_nodes)
+                if len(chains) % PROGRESS_INTERVAL == 0:
+                    progress(folded, [total - len(folded)])
+
+        sources = np.repeat(nodes, np.diff(offsets))
+        for e in np.flatnonzero(~interior[sources] & interior[targets]).tolist():
+            if chain_of[targets[e]] < 0:
+                walk(int(sources[e]), int(targets[e]), float(weights[e]))
+        # A cycle of degree-2 nodes only keeps one of them
+        for u in np.flatnonzero(interior).tolist():
+            if interior[u] and chain_of[u] < 0:
+                interior[u] = False
+                v, w = next(iter(csr.weighted_neighbors(u)))
+                walk(u, v, w)
+        # Only chains cheaper than a direct edge between their ends are used
+        for a, b in [pair for pair, (length, _) in links.items() if csr.edge_weight(*pair) <= length]:
+            del links[a, b]
+
+        kept = np.flatnonzero(~interior)
+        compressed = np.full(n, -1, dtype=np.int64)
+        compressed[kept] = np.arange(len(kept))
+        direct = ~interior[sources] & ~interior[targets] & (sources < targets)
+        pairs = np.array([(a, b, length) for (a, b), (length, _) in links.items() if a < b],
+                         dtype=np.float64).reshape(-1, 3)
+        graph = CSRGraph.from_arrays(np.asarray(csr.node_ids)[kept], np.asarray(csr.coords)[kept],
+                                     compressed[np.concatenate([sources[direct], pairs[:, 0].astype(np.int64)])],
+                                     compressed[np.concatenate([targets[direct], pairs[:, 1].astype(np.int64)])],
+                                     np.concatenate([weights[direct], pairs[:, 2]]))
+        return cls(kept, graph, chains, links, chain_of, position, along)
+
+    def _ends(self, i):
+        # Kept nodes through which a query at full index i enters or leaves the
+        # compressed graph, with the cost along its chain to reach them
+        if self.compressed[i] >= 0:
+            return {int(self.compressed[i]): 0.0}
+        start, end, _, length = self.chains[self.chain_of[i]]
+        ends = {}
+        for node, cost in ((start, self.along[i]), (end, length - self.along[i])):
+            k = int(self.compressed[node])
+            if cost < ends.get(k, math.inf):
+                ends[k] = float(cost)
+        return ends
+
+    def _chain_part(self, i, kept_node):
+        # Interior nodes between interior node i and the kept end of its
+        # chain, from i outward
+        start, end, interior_nodes, length = self.chains[self.chain_of[i]]
+        p = self.position[i]
+        if kept_node == start and (start != end or self.along[i] <= length - self.along[i]):
+            return interior_nodes[:p][::-1]
+        return interior_nodes[p + 1:]
+
+    def _same_chain(self, source, target):
+        # Direct route along a chain holding both ends, as (cost, path)
+        c = self.chain_of[source]
+        if c < 0 or self.chain_of[target] != c:
+            return math.inf, None
+        interior_nodes = self.chains[c][2]
+        p, q = self.position[source], self.position[target]
+        path = interior_nodes[p:q + 1] if p <= q else interior_nodes[q:p + 1][::-1]
+        return abs(self.along[source] - self.along[target]), path
+
+    def expand(self, path):
+        # Full CSR path of a path of kept nodes (full indices)
+        full = path[:1]
+        for a, b in zip(path, path[1:]):
+            if (a, b) in self.links:
+                start, _, interior_nodes, _ = self.chains[self.links[a, b][1]]
+                full += interior_nodes if start == a else interior_nodes[::-1]
+            full.append(b)
+        return full
+
+    def search(self, source, target, heuristic=None, progress=None):
+        # A* (Dijkstra without a heuristic, which takes full indices) between
+        # full CSR indices; same result shape as CSRGraph.dijkstra_search, with
+        # the path expanded and order holding the kept nodes settled
+        if source == target:
+            return [source], [source], [0]
+        kept_list = self.kept_list
+        estimate = (lambda k: heuristic(kept_list[k])) if heuristic else None
+        settled = []
+
+        def report(order, frontier):
+            settled.extend(kept_list[k] for k in order[len(settled):])
+            progress(settled, frontier)
+
+        path, order, frontier, cost = self.graph.seeded_search(self._ends(source), self._ends(target), estimate,
+                                                               report if progress else None)
+        order = [kept_list[k] for k in order]
+        direct_cost, direct = self._same_chain(source, target)
+        if direct is not None and direct_cost <= cost:
+            return direct, order, frontier
+        if path is None:
+            return None, order, frontier
+        path = self.expand([kept_list[k] for k in path])
+        if self.compressed[source] < 0:
+            path = [source] + self._chain_part(source, path[0]) + path
+        if self.compressed[target] < 0:
+            path = path + self._chain_part(target, path[-1])[::-1] + [target]
+        return path, order, frontier
+
+
+class SpatialIndex:
+    # Uniform grid of square buckets over node positions, for nearest-node
+    # picking and for finding what lies inside a rectangle (the visible part of
+    # the canvas). Edges are not bucketed; an edge is found through its end
+    # nodes, searching a rectangle grown by the longest edge seen so far.
+    def __init__(self, cell_size=32.0):
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        self.positions = {}
+        self.max_edge_length = 0.0
+        self._bounds = None  # min/max cell coordinates in use
+
+    @classmethod
+    def build(cls, positions, edge_lengths=(), cell_size=32.0):
+        index = cls(cell_size)
+        for node, (x, y) in positions.items():
+            index.insert(node, x, y)
+        index.max_edge_length = max(edge_lengths, default=0.0)
+        return index
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _cell(self, x, y):
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def insert(self, node, x, y):
+        cell = self._cell(x, y)
+        self.cells.setdefault(cell, []).append(node)
+        self.positions[node] = (x, y)
+        if self._bounds is None:
+            self._bounds = [cell[0], cell[1], cell[0], cell[1]]
+        else:
+            bounds = self._bounds
+            bounds[0], bounds[1] = min(bounds[0], cell[0]), min(bounds[1], cell[1])
+            bounds[2], bounds[3] = max(bounds[2], cell[0]), max(bounds[3], cell[1])
+
+    def note_edge(self, length):
+        self.max_edge_length = max(self.max_edge_length, length)
+
+    def nearest(self, x, y, max_radius=None):
+        # Closest node to (x, y), or None if there is none within max_radius
+        if self._bounds is None:
+            return None
+        cx, cy = self._cell(x, y)
+        min_x, min_y, max_x, max_y = self._bounds
+        last_ring = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy, 0)
+        if max_radius is not None:
+            last_ring = min(last_ring, int(math.ceil(max_radius / self.cell_size)))
+        best = None
+        best_d2 = math.inf if max_radius is None else max_radius * max_radius
+
+        # Visit rings of cells around (x, y); nothing in ring r+1 or beyond can be
+        # closer than r cells, so stop once the best match is within that distance
+        for ring in range(last_ring + 1):
+            for gx in range(cx - ring, cx + ring + 1):
+                step = 1 if abs(gx - cx) == ring else 2 * ring
+                for gy in range(cy - ring, cy + ring + 1, max(step, 1)):
+                    for node in self.cells.get((gx, gy), ()):
+                        px, py = self.positions[node]
+                        d2 = (px - x) ** 2 + (py - y) ** 2
+                        if d2 <= best_d2:
+                            best, best_d2 = node, d2
+            if best is not None and (ring * self.cell_size) ** 2 >= best_d2:
+                break
+        return best
+
+    def nodes_in_rect(self, x0, y0, x1, y1):
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        gx0, gy0 = self._cell(x0, y0)
+        gx1, gy1 = self._cell(x1, y1)
+        if (gx1 - gx0 + 1) * (gy1 - gy0 + 1) > len(self.cells):
+            cells = [cell for cell in self.cells if gx0 <= cell[0] <= gx1 and gy0 <= cell[1] <= gy1]
+        else:
+            cells = [(gx, gy) for gx in range(gx0, gx1 + 1) for gy in range(gy0, gy1 + 1)]
+        nodes = []
+        for cell in cells:
+            for node in self.cells.get(cell, ()):
+                px, py = self.positions[node]
+                if x0 <= px <= x1 and y0 <= py <= y1:
+                    nodes.append(node)
+        return nodes
+
+    def edge_candidates(self, x0, y0, x1, y1):
+        # Nodes that can be an end of an edge crossing the rectangle
+        margin = self.max_edge_length
+        return self.nodes_in_rect(min(x0, x1) - margin, min(y0, y1) - margin,
+                                  max(x0, x1) + margin, max(y0, y1) + margin)
+
+
+class ShortestPathTree:
+    # Resumable single-source Dijkstra. The search stops as soon as the
+    # requested target is settled and picks up from the same heap when a later
+    # query asks for a node that has not been settled yet.
+    def __init__(self, csr, source):
+        self.csr = csr
+        self.source = source
+        self.dist = {source: 0.0}
+        self.parent = {source: -1}
+        self.position = {}  # settled node -> index in order
+        self.order = []
+        self.frontier = []
+        self.heap = [(0.0, source)]
+
+    def settle_until(self, target, progress=None):
+        # Cancelling through progress leaves the tree consistent, so the next
+        # query simply resumes
+        dist, position = self.dist, self.position
+        pushes, start = 0, len(self.order)
+        try:
+            while target not in position and self.heap:
+                d, u = heapq.heappop(self.heap)
+                if u in position:
+                    continue
+                position[u] = len(self.order)
+                self.order.append(u)
+                for v, w in self.csr.weighted_neighbors(u):
+                    nd = d + w
+                    if v not in position and (v not in dist or nd < dist[v]):
+                        dist[v] = nd
+                        self.parent[v] = u
+                        heapq.heappush(self.heap, (nd, v))
+                        pushes += 1
+                self.frontier.append(len(dist) - len(position))
+                if progress and len(self.order) % PROGRESS_INTERVAL == 0:
+                    progress(self.order, self.frontier)
+        finally:
+            self.csr._count_work(pushes, self.order[start:])
+        return target in position
+
+    def search(self, target, progress=None):
+        # Same result shape as CSRGraph.dijkstra_search
+        if not self.settle_until(target, progress):
+            return None, list(self.order), list(self.frontier)
+        end = self.position[target] + 1
+        return self.csr._walk_back(self.parent, target), self.order[:end], self.frontier[:end]
+
+    def repair(self, csr, changes):
+        # Bring the tree up to date with csr after the edge weight changes
+        # (i, j, old weight, new weight), inf meaning no edge, in the style of
+        # Ramalingam-Reps: only nodes whose distance can have changed are
+        # searched again, and only within the radius already settled.
+        dist, parent, position = self.dist, self.parent, self.position
+        radius = dist[self.order[-1]] if self.order else 0.0
+        old_order = self.order
+        self.csr = csr
+
+        # Increased or removed tree edges invalidate the subtree below them,
+        # settled or not
+        roots = []
+        for i, j, old, new in changes:
+            if new > old:
+                roots += [v for u, v in ((i, j), (j, i)) if parent.get(v) == u]
+        affected = set()
+        if roots:
+            children = {}
+            for v, u in parent.items():
+                children.setdefault(u, []).append(v)
+            stack = roots
+            while stack:
+                v = stack.pop()
+                if v not in affected:
+                    affected.add(v)
+                    stack.extend(children.get(v, ()))
+            for v in affected:
+                del dist[v], parent[v]
+                position.pop(v, None)
+
+        work = []
+
+        def relax(u, v, d):
+            if d < dist.get(v, math.inf):
+                dist[v] = d
+                parent[v] = u
+                heapq.heappush(work, (d, v))
+
+        # Seeds: affected nodes from their remaining settled neighbors, the far
+        # ends of decreased edges, and open nodes that now fall in the radius
+        for v in affected:
+            for u, w in csr.weighted_neighbors(v):
+                if u in position:
+                    relax(u, v, dist[u] + w)
+        for i, j, old, new in changes:
+            if new < old:
+                for u, v in ((i, j), (j, i)):
+                    if u in position:
+                        relax(u, v, dist[u] + new)
+        for v, d in dist.items():
+            if v not in position and d <= radius:
+                heapq.heappush(work, (d, v))
+
+        # Dijkstra over the seeds up to the old radius; whatever lies beyond it
+        # stays open for settle_until
+        done = set()
+        while work and work[0][0] <= radius:
+            d, v = heapq.heappop(work)
+            if v in done or d > dist[v]:
+                continue
+            done.add(v)
+            position[v] = None
+            for u, w in csr.weighted_neighbors(v):
+                relax(v, u, d + w)
+
+        if not affected and not done:
+            # No settled distance changed; just offer the improved open nodes
+            for entry in work:
+                heapq.heappush(self.heap, entry)
+            return
+
+        # Settled nodes in distance order, and the open set as a fresh heap
+        self.order = sorted(position, key=dist.__getitem__)
+        self.position = {v: k for k, v in enumerate(self.order)}
+        self.heap = [(d, v) for v, d in dist.items() if v not in self.position]
+        heapq.heapify(self.heap)
+
+        # Frontier sizes are only known up to the first reordered node; past it
+        # the current open count stands in
+        unchanged = 0
+        for old, new in zip(old_order, self.order):
+            if old != new:
+                break
+            unchanged += 1
+        self.frontier = self.frontier[:unchanged] + [len(self.heap)] * (len(self.order) - unchanged)
+
+
+# Multi-route searches. Both take the ShortestPathTree of the target, which
+# gives the first path and, through its settled distances, a consistent A*
+# heuristic for every later search (removing edges or raising weights never
+# shortens a distance). They return (paths, lengths, order, truncated) with the
+# paths best first. The work after the first path is bounded by max_settled
+# nodes settled over all further searches and time_limit seconds, after which
+# the routes found so far are returned with truncated set.
+
+def _tree_route(tree, source, target, progress=None):
+    # Path and heuristic from the target's tree; path None if unreachable
+    if not tree.settle_until(source, progress):
+        return None, None, tree.order
+    radius = tree.dist[tree.order[-1]]
+    dist, position = tree.dist, tree.position
+
+    def heuristic(i):
+        # Unsettled nodes are at least as far as the last one settled
+        return dist[i] if i in position else radius
+
+    path = tree.csr._walk_back(tree.parent, source)[::-1]
+    return path, heuristic, tree.order[:position[source] + 1]
+
+
+def yen_k_shortest_paths(csr, tree, source, target, k=3, max_settled=100000, time_limit=2.0, progress=None):
+    # Yen's algorithm for the k shortest loopless paths
+    path, heuristic, order = _tree_route(tree, source, target, progress)
+    if path is None:
+        return [], [], list(order), False
+    deadline = time.perf_counter() + time_limit
+    order, spent = list(order), 0
+    report = progress and (lambda settled, frontier: progress(order, frontier))
+    paths, lengths = [path], [csr.path_cost(path)]
+    candidates, seen = [], {tuple(path)}
+    truncated = False
+
+    while len(paths) < k and not truncated:
+        previous = paths[-1]
+        root_cost = 0.0
+        for i, spur in enumerate(previous[:-1]):
+            if time.perf_counter() > deadline or spent >= max_settled:
+                truncated = True
+                break
+            root = previous[:i + 1]
+            blocked_nodes = set(root[:-1])
+            blocked_edges = set()
+            for accepted in paths:
+                if accepted[:i + 1] == root:
+                    blocked_edges.update(((accepted[i], accepted[i + 1]), (accepted[i + 1], accepted[i])))
+
+            # The tree path from the spur node is optimal when nothing blocks it
+            spur_path = [spur]
+            while spur_path[-1] != target and spur_path[-1] in tree.position:
+                next_node = tree.parent[spur_path[-1]]
+                if next_node in blocked_nodes or (spur_path[-1], next_node) in blocked_edges:
+                    break
+                spur_path.append(next_node)
+            if spur_path[-1] != target:
+                spur_path, settled = csr.restricted_search(spur, target, heuristic, blocked_nodes, blocked_edges,
+                                                           max_settled=max_settled - spent, progress=report)
+                order += settled
+                spent += len(settled)
+
+            if spur_path is not None:
+                candidate = root[:-1] + spur_path
+                if tuple(candidate) not in seen:
+                    seen.add(tuple(candidate))
+                    heapq.heappush(candidates, (root_cost + csr.path_cost(spur_path), candidate))
+            root_cost += csr.edge_weight(previous[i], previous[i + 1])
+
+        if not candidates:
+            break
+        length, path = heapq.heappop(candidates)
+        paths.append(path)
+        lengths.append(length)
+    return paths, lengths, order, truncated
+
+
+def penalty_alternative_routes(csr, tree, source, target, k=3, penalty=1.5, max_overlap=0.7, max_stretch=1.5,
+                               max_settled=100000, time_limit=2.0, progress=None):
+    # Penalty method: search again with the edges of every route found so far
+    # made more expensive, keeping routes that share at most max_overlap of
+    # their length with any kept route and are at most max_stretch times the
+    # shortest. Much cheaper than Yen's, but not guaranteed to be the k best.
+    path, heuristic, order = _tree_route(tree, source, target, progress)
+    if path is None:
+        return [], [], list(order), False
+    if source == target:
+        # The empty route is the only one
+        return [path], [0.0], list(order), False
+    deadline = time.perf_counter() + time_limit
+    order, spent = list(order), 0
+    report = progress and (lambda settled, frontier: progress(order, frontier))
+    paths, lengths = [path], [csr.path_cost(path)]
+    seen = {tuple(path)}
+    edge_sets = [set(zip(path, path[1:]))]
+    penalties = {}
+    truncated = False
+
+    for _ in range(4 * k):
+        if len(paths) >= k:
+            break
+        if time.perf_counter() > deadline or spent >= max_settled:
+            truncated = True
+            break
+        for i, j in zip(path, path[1:]):
+            penalties[i, j] = penalties[j, i] = penalties.get((i, j), 1.0) * penalty
+        path, settled = csr.restricted_search(source, target, heuristic, penalties=penalties,
+                                              max_settled=max_settled - spent, progress=report)
+        order += settled
+        spent += len(settled)
+        if path is None:
+            truncated = spent >= max_settled
+            break
+        if tuple(path) in seen:
+            # The penalties did not push the search off the known routes yet
+            continue
+        seen.add(tuple(path))
+        length = csr.path_cost(path)
+        if length > max_stretch * lengths[0]:
+            break
+
+        edges = set(zip(path, path[1:]))
+        shared = max(sum(csr.edge_weight(i, j) for i, j in edges & (kept | {(j, i) for i, j in kept}))
+                     for kept in edge_sets)
+        if shared <= max_overlap * length:
+            paths.append(path)
+            lengths.append(length)
+            edge_sets.append(edges)
+
+    ranked = sorted(range(len(paths)), key=lengths.__getitem__)
+    return [paths[r] for r in ranked], [lengths[r] for r in ranked], order, truncated
+
+
+class Profiler:
+    # Timers, counters and memory readings for searches, drawing and file I/O.
+    # Every timed event is also kept as a flat record (the last `capacity` of
+    # them) for export as JSON lines; with log_path set, each record is also
+    # appended to that file as it happens. Safe to use from worker threads.
+    counted = ('nodes_settled', 'edges_relaxed', 'heap_pushes', 'canvas_items', 'bytes')
+
+    def __init__(self, capacity=10000, log_path=None):
+        self.capacity = capacity
+        self.log_path = log_path
+        self.session = f"{os.getpid()}-{int(time.time())}"
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.timers = {}  # event -> [calls, total seconds, max seconds]
+            self.counters = {}
+            self.records = deque(maxlen=self.capacity)
+
+    @staticmethod
+    def trace_memory(enabled):
+        # Python allocation tracing is exact but slows everything down, so it
+        # is only on when asked for; peak RSS is always reported where known
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not enabled and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @staticmethod
+    def memory():
+        memory = {}
+        if resource is not None:
+            # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            memory['peak_rss_kb'] = peak // 1024 if sys.platform == 'darwin' else peak
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            memory['traced_kb'] = current // 1024
+            memory['traced_peak_kb'] = peak // 1024
+        return memory
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record(self, event, seconds, **fields):
+        # Fields named in `counted` also add to the running counters
+        record = {'time': time.time(), 'session': self.session, 'event': event, 'seconds': seconds}
+        record.update(fields)
+        with self.lock:
+            timer = self.timers.setdefault(event, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+            for name in self.counted:
+                if fields.get(name):
+                    self.counters[name] = self.counters.get(name, 0) + fields[name]
+            self.records.append(record)
+            if self.log_path:
+                with open(self.log_path, 'a') as f:
+                    f.write(json.dumps(record, default=str) + "\n")
+        return record
+
+    @contextlib.contextmanager
+    def timer(self, event, **fields):
+        # with profiler.timer("load", ...) as fields: the block may add fields
+        # to its record; a block left by an exception records the error
+        traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        started = time.perf_counter()
+        try:
+            yield fields
+        except BaseException as e:
+            fields['error'] = type(e).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            if traced is not None and tracemalloc.is_tracing():
+                fields['memory_kb'] = (tracemalloc.get_traced_memory()[0] - traced) // 1024
+            self.record(event, seconds, **fields)
+
+    def summary(self):
+        with self.lock:
+            timers = {event: {'calls': calls, 'total_seconds': total, 'mean_ms': total / calls * 1000.0,
+                              'max_ms': longest * 1000.0}
+                      for event, (calls, total, longest) in self.timers.items()}
+            counters = dict(self.counters)
+            records = len(self.records)
+        return {'timers': timers, 'counters': counters, 'memory': self.memory(), 'records': records}
+
+    def export(self, filename):
+        # Write the kept records to filename as JSON lines; returns how many
+        with self.lock:
+            records = list(self.records)
+        with open(filename, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record, default=str) + "\n")
+        return len(records)
+
+
+# Shared by every GraphTool unless given its own
+profiler = Profiler()
+
+
+class QueryCache:
+    # LRU cache of search results keyed on (algorithm, start, end, options,
+    # graph version), plus a bounded set of ShortestPathTrees by source index.
+    # Besides the entry counts, results and trees together are kept within
+    # memory_budget bytes, estimated at item_bytes per cached Python element
+    # (traversal orders and tree dicts dominate on large graphs).
+    item_bytes = 64
+
+    def __init__(self, capacity=256, tree_capacity=16, memory_budget=256 * 1024 * 1024):
+        self.capacity = capacity
+        self.tree_capacity = tree_capacity
+        self.memory_budget = memory_budget
+        self.results = OrderedDict()
+        self.result_sizes = {}  # key -> estimated bytes
+        self.result_bytes = 0
+        self.trees = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.tree_hits = 0
+        self.tree_misses = 0
+        self.tree_evictions = 0
+
+    def get(self, key):
+        if key in self.results:
+            self.results.move_to_end(key)
+            self.hits += 1
+            return self.results[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.result_bytes -= self.result_sizes.get(key, 0)
+        self.results[key] = value
+        self.results.move_to_end(key)
+        self.result_sizes[key] = _count_items(value) * self.item_bytes
+        self.result_bytes += self.result_sizes[key]
+        self._evict()
+
+    def _tree_bytes(self, tree):
+        # Trees keep growing as later queries settle more of them
+        items = 2 * len(tree.dist) + len(tree.parent) + len(tree.position) + len(tree.order) + len(tree.frontier)
+        return (items + len(tree.heap)) * self.item_bytes
+
+    def nbytes(self):
+        return self.result_bytes + sum(self._tree_bytes(tree) for tree in self.trees.values())
+
+    def _pop_result(self):
+        key, _ = self.results.popitem(last=False)
+        size = self.result_sizes.pop(key)
+        self.result_bytes -= size
+        self.evictions += 1
+        return size
+
+    def _pop_tree(self):
+        _, tree = self.trees.popitem(last=False)
+        self.tree_evictions += 1
+        return self._tree_bytes(tree)
+
+    def _evict(self):
+        # Least recently used first; over the memory budget results go before
+        # trees, and the newest of each is always kept
+        while len(self.results) > self.capacity:
+            self._pop_result()
+        while len(self.trees) > self.tree_capacity:
+            self._pop_tree()
+        total = self.nbytes()
+        while total > self.memory_budget and len(self.results) > 1:
+            total -= self._pop_result()
+        while total > self.memory_budget and len(self.trees) > 1:
+            total -= self._pop_tree()
+
+    def tree(self, csr, source):
+        tree = self.trees.get(source)
+        if tree is not None and tree.csr is csr:
+            self.trees.move_to_end(source)
+            self.tree_hits += 1
+            return tree
+        self.tree_misses += 1
+        tree = self.trees[source] = ShortestPathTree(csr, source)
+        self.trees.move_to_end(source)
+        self._evict()
+        return tree
+
+    def clear_trees(self):
+        self.trees.clear()
+
+    def clear(self):
+        self.results.clear()
+        self.result_sizes.clear()
+        self.result_bytes = 0
+        self.trees.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'tree_hits': self.tree_hits,
+            'tree_misses': self.tree_misses,
+            'tree_evictions': self.tree_evictions,
+            'entries': len(self.results),
+            'trees': len(self.trees),
+            'bytes': self.nbytes(),
+        }
+
+
+def _count_items(value):
+    # Elements in the containers of a cached value, nested ones included
+    if isinstance(value, dict):
+        return 2 * len(value) + sum(_count_items(item) for item in value.values()
+                                    if not isinstance(item, (int, float)))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return len(value) + sum(_count_items(item) for item in value if not isinstance(item, (int, float)))
+    return 0
+
+
+def cached_query(algorithm):
+    # Serve repeated GraphTool queries from its QueryCache. Only successful
+    # searches are stored, so failures still report their error every time.
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, start_node, end_node, **kwargs):
+            key = (algorithm, start_node, end_node, tuple(sorted(kwargs.items())), self.version)
+            with self.profiler.timer("search." + algorithm, start=start_node, end=end_node) as fields:
+                cached = self.query_cache.get(key)
+                if cached is not None:
+                    result, self.last_stats = cached
+                    self.last_error = None
+                    fields.update(cache_hit=True, found=bool(result[0]))
+                    self.profiler.count('cache_hits')
+                    return result
+                self.profiler.count('searches')
+                result = method(self, start_node, end_node, **kwargs)
+                if result[0]:
+                    self.query_cache.put(key, (result, self.last_stats))
+                fields.update(cache_hit=False, found=bool(result[0]),
+                              nodes_settled=self.last_stats.get('settled', 0),
+                              edges_relaxed=self.last_stats.get('edges_relaxed', 0),
+                              heap_pushes=self.last_stats.get('heap_pushes', 0))
+                return result
+        return wrapper
+    return decorator
+
+
+class GraphTool:
+    def __init__(self):
+        self._csr = None
+        self.graph = nx.Graph()
+        self.positions = {}
+        self.current_node = 0
+        self.map_path = "map.jpg"  # Default map path
+        self.ch = None
+        self.landmarks = None
+        self.compression = None
+        self.all_pairs = None
+        self.last_stats = {}
+        self.version = 0
+        self.query_cache = QueryCache()
+        self.last_error = None
+        self._spatial = None
+        self._mapping = None  # (path, mmap) of the loaded graph file
+        self.profiler = profiler
+        # Optional progress(settled, frontier_size, new_nodes) callback for the
+        # next searches, new_nodes being the node ids settled since the last
+        # call. It may raise SearchCancelled to stop the search.
+        self.progress = None
+
+    # A graph loaded from a binary graph file only has its CSR arrays; the
+    # NetworkX graph and positions dict are built the first time they are used
+    @property
+    def graph(self):
+        if self._graph is None:
+            self._materialize()
+        return self._graph
+
+    @graph.setter
+    def graph(self, graph):
+        self._graph = graph
+
+    @property
+    def positions(self):
+        if self._positions is None:
+            self._materialize()
+        return self._positions
+
+    @positions.setter
+    def positions(self, positions):
+        self._positions = positions
+
+    def _materialize(self):
+        csr = self._csr
+        nodes = csr.node_list
+        self._positions = {node: tuple(xy) for node, xy in zip(nodes, csr.coords.tolist())}
+        graph = nx.Graph()
+        graph.add_nodes_from((node, {'pos': self._positions[node]}) for node in nodes)
+
+        # Each undirected edge is stored in both directions; keep one of them
+        sources = np.repeat(np.arange(len(csr)), np.diff(csr.offsets))
+        keep = sources <= csr.targets
+        graph.add_weighted_edges_from(
+            (nodes[i], nodes[j], w)
+            for i, j, w in zip(sources[keep].tolist(), csr.targets[keep].tolist(), csr.weights[keep].tolist()))
+        self._graph = graph
+
+    @property
+    def csr(self):
+        # Compact search arrays, rebuilt lazily after the graph was modified
+        if self._csr is None:
+            self._csr = CSRGraph.from_graph(self.graph, self.positions)
+        return self._csr
+
+    def mark_modified(self):
+        # Any edit invalidates derived structures; the version bump keeps cached
+        # results of the previous graph from being served again
+        self.version += 1
+        self._csr = None
+        self.ch = None
+        self.landmarks = None
+        self.compression = None
+        self.all_pairs = None
+        self.query_cache.clear_trees()
+
+    def clear(self):
+        self.graph = nx.Graph()
+        self.positions = {}
+        self.current_node = 0
+        self._spatial = None
+        self.mark_modified()
+
+    def report_error(self, message):
+        # Headless default: keep the message for the caller. The GUI overrides
+        # this to show a dialog.
+        self.last_error = message
+
+    def save(self, filename):
+        # Write to a temporary file first: the current arrays may be mapped from
+        # the very file being replaced
+        with self.profiler.timer("save", file=filename) as fields:
+            temporary = filename + ".tmp"
+            write_graph_file(temporary, self.csr, self.current_node)
+            self._close_mapping(filename)
+            os.replace(temporary, filename)
+            self.save_contraction_hierarchy(filename)
+            fields['bytes'] = os.path.getsize(filename)
+
+    def _close_mapping(self, filename):
+        # Windows cannot replace a file while it is mapped, so arrays still
+        # viewing the mapping are copied into memory and the mapping closed
+        mapping = self._mapping
+        if mapping is None or mapping[0] != os.path.abspath(filename):
+            return
+        self._mapping = None
+        if self._csr is not None:
+            self._csr.copy_arrays()
+        try:
+            mapping[1].close()
+        except BufferError:
+            pass  # still viewed elsewhere; unmapped once the last view goes
+
+    def set_csr(self, csr, next_node):
+        # Replace the graph with ready-made search arrays; the NetworkX graph
+        # and positions are only built if something asks for them
+        self.mark_modified()
+        self.graph = self.positions = None
+        self._csr = csr
+        self.current_node = next_node
+        self._spatial = None
+
+    def load(self, filename):
+        with self.profiler.timer("load", file=filename) as fields:
+            if is_graph_file(filename):
+                fields['format'] = "binary"
+                self.set_csr(*read_graph_file(filename))
+                self._mapping = (self._csr.path, self._csr.mapping)
+            else:
+                # Legacy pickled (nx.Graph, positions, current_node) file
+                fields['format'] = "pickle"
+                with open(filename, 'rb') as f:
+                    self.graph, self.positions, self.current_node = pickle.load(f)
+                self.mark_modified()
+            self._spatial = None
+            self.load_contraction_hierarchy(filename)
+            fields['bytes'] = os.path.getsize(filename)
+
+    def path_length(self, path):
+        csr = self.csr
+        indices = csr.indices(*path)
+        return sum(csr.edge_weight(i, j) for i, j in zip(indices, indices[1:]))
+
+    def build_landmarks(self, count=8, strategy="farthest", progress=None):
+        with self.profiler.timer("build.landmarks", count=count, strategy=strategy):
+            self.landmarks = Landmarks.select(self.csr, count, strategy, progress=progress)
+        return self.landmarks
+
+    def distance_matrix(self, sources, targets, processes=None, return_predecessors=False):
+        # Headless many-to-many distances; unknown nodes raise nx.NodeNotFound.
+        # Predecessor columns follow csr.node_ids and hold node ids (-1 for none).
+        csr = self.csr
+        distances, predecessors = batch_distance_matrix(
+            csr, csr.indices(*sources), csr.indices(*targets), processes, return_predecessors)
+        if not return_predecessors:
+            return distances
+        node_ids = np.asarray(csr.node_ids)
+        return distances, np.where(predecessors >= 0, node_ids[predecessors], -1)
+
+    def isochrones(self, sources, budget, processes=None):
+        # Everything reachable from each source within the cost budget, as a
+        # list of ({node: distance}, [(node1, node2, fraction)]) per source.
+        # Boundary edges lead from a reached node to an unreached one, the
+        # budget running out fraction of the way along. Unknown nodes raise
+        # nx.NodeNotFound.
+        csr = self.csr
+        results = batch_isochrones(csr, csr.indices(*sources), budget, processes)
+        node_list = csr.node_list
+        return [({node_list[i]: d for i, d in reached.items()},
+                 [(node_list[i], node_list[j], fraction) for i, j, fraction in boundary])
+                for reached, boundary in results]
+
+    def build_chain_compression(self, progress=None):
+        with self.profiler.timer("build.chains") as fields:
+            self.compression = ChainCompression.build(self.csr, progress)
+            fields['kept_nodes'] = len(self.compression.kept)
+        return self.compression
+
+    def preprocess(self):
+        # Component labels (for rejecting unreachable queries up front) and
+        # the chain-compressed search graph, with a summary of both
+        csr = self.csr
+        components = np.bincount(csr.components) if len(csr) else np.zeros(0, dtype=np.int64)
+        compression = self.build_chain_compression()
+        return {
+            'components': len(components),
+            'largest_component': int(components.max(initial=0)),
+            'kept_nodes': len(compression.kept),
+            'chain_nodes': len(csr) - len(compression.kept),
+            'chains': len(compression.chains),
+            'search_edges': len(compression.graph.targets) // 2,
+        }
+
+    def reachable(self, start_node, end_node):
+        # Constant time once the component labels exist; unknown nodes raise
+        # nx.NodeNotFound
+        csr = self.csr
+        return bool(csr.connected(*csr.indices(start_node, end_node)))
+
+    def build_all_pairs(self, method="auto", processes=None, max_nodes=5000, progress=None):
+        # n x n distance and predecessor tables; see AllPairs
+        csr = self.csr
+        if len(csr) > max_nodes:
+            raise ValueError(f"All-pairs tables are limited to {max_nodes} nodes, the graph has {len(csr)}")
+        with self.profiler.timer("build.all_pairs", method=method, nodes=len(csr)):
+            self.all_pairs = AllPairs.build(csr, method, processes, progress)
+        return self.all_pairs
+
+    def analytics(self, progress=None):
+        # Eccentricity (within the node's component) and betweenness of every
+        # node, with the diameter and radius, from the all-pairs tables.
+        # progress is passed to the table build and the betweenness passes;
+        # raising SearchCancelled from it stops either.
+        all_pairs = self.all_pairs or self.build_all_pairs(progress=progress)
+        nodes = self.csr.node_list
+        eccentricity = all_pairs.eccentricity()
+        with self.profiler.timer("analytics.betweenness", nodes=len(nodes)):
+            betweenness = all_pairs.betweenness(progress)
+        return {
+            'diameter': float(eccentricity.max()) if len(nodes) else 0.0,
+            'radius': float(eccentricity.min()) if len(nodes) else 0.0,
+            'eccentricity': dict(zip(nodes, eccentricity.tolist())),
+            'betweenness': dict(zip(nodes, betweenness.tolist())),
+        }
+
+    def build_contraction_hierarchy(self, progress=None):
+        with self.profiler.timer("build.ch"):
+            self.ch = ContractionHierarchy.build(self.csr, progress=progress)
+        return self.ch
+
+    def save_contraction_hierarchy(self, graph_path):
+        # A sidecar left from an earlier save would describe another graph
+        if self.ch is not None:
+            self.ch.save(graph_path)
+        elif os.path.exists(ContractionHierarchy.path_for(graph_path)):
+            os.remove(ContractionHierarchy.path_for(graph_path))
+
+    def load_contraction_hierarchy(self, graph_path):
+        # Reuse a hierarchy saved next to the .graph file if it fits the graph
+        try:
+            ch = ContractionHierarchy.load(graph_path)
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            return False  # missing or corrupt; the hierarchy is rebuilt on demand
+        if not ch.matches(self.csr):
+            return False
+        self.ch = ch
+        return True
+
+    @property
+    def spatial_index(self):
+        # Built on first use, then kept up to date by add_node/add_edge
+        if self._spatial is None:
+            positions = self.positions
+            lengths = (math.dist(positions[u], positions[v]) for u, v in self.graph.edges())
+            self._spatial = SpatialIndex.build(positions, lengths)
+        return self._spatial
+
+    def nearest_node(self, x, y, max_radius=None):
+        return self.spatial_index.nearest(x, y, max_radius)
+
+    def visible_elements(self, x0, y0, x1, y1):
+        # Nodes inside the rectangle and edges whose bounding box overlaps it
+        index = self.spatial_index
+        nodes = index.nodes_in_rect(x0, y0, x1, y1)
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        edges = []
+        for node1, node2, data in self.graph.edges(index.edge_candidates(x0, y0, x1, y1), data=True):
+            (ax, ay), (bx, by) = self.positions[node1], self.positions[node2]
+            if min(ax, bx) <= x1 and max(ax, bx) >= x0 and min(ay, by) <= y1 and max(ay, by) >= y0:
+                edges.append((node1, node2, data))
+        return nodes, edges
+
+    def node_count(self):
+        # Without rebuilding the search arrays after an edit
+        return len(self._csr) if self._csr is not None else self.graph.number_of_nodes()
+
+    def count_in_rect(self, x0, y0, x1, y1):
+        # Nodes inside the rectangle, counted on the search arrays in bulk while
+        # they are current and through the spatial index after an edit, so
+        # neither is rebuilt just to count
+        csr = self._csr
+        if csr is None:
+            return len(self.spatial_index.nodes_in_rect(x0, y0, x1, y1))
+        coords = np.asarray(csr.coords)
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        return int(np.count_nonzero((coords[:, 0] >= x0) & (coords[:, 0] <= x1) &
+                                    (coords[:, 1] >= y0) & (coords[:, 1] <= y1)))
+
+    def add_node(self, position):
+        self.graph.add_node(self.current_node, pos=position)
+        self.positions[self.current_node] = position
+        node_id = self.current_node
+        self.current_node += 1
+        if self._spatial is not None:
+            self._spatial.insert(node_id, *position)
+        self.mark_modified()
+        return node_id
+
+    def update_edges(self, changes):
+        # Bulk edge updates: changes is an iterable of (node1, node2, weight),
+        # where weight None removes the edge and a missing edge is added. The
+        # search arrays are patched and cached shortest-path trees repaired in
+        # place instead of being rebuilt. Returns the number of edges changed.
+        # The whole batch is checked before anything changes, so a bad entry
+        # leaves the graph, the search arrays and the cached trees in step
+        csr = self.csr
+        graph = self.graph
+        applied = {}  # edge -> (i, j, weight before the batch, weight after)
+        checked = []
+        for node1, node2, weight in changes:
+            i, j = csr.indices(node1, node2)
+            if i == j:
+                raise ValueError(f"Self-loop on node {node1} is not allowed")
+            if weight is not None and not (math.isfinite(weight) and weight >= 0):
+                raise ValueError(f"Edge weight must be finite and non-negative, got {weight} for {node1}-{node2}")
+            key = (min(i, j), max(i, j))
+            if key in applied:
+                old = applied[key][2]
+                present = not math.isinf(applied[key][3])
+            else:
+                old = graph.edges[node1, node2].get('weight', 1.0) if graph.has_edge(node1, node2) else math.inf
+                present = not math.isinf(old)
+            if weight is None and not present:
+                raise ValueError(f"No edge between {node1} and {node2} to remove")
+            new = math.inf if weight is None else weight
+            applied[key] = (i, j, old, new)
+            checked.append((node1, node2, weight, i, j, present))
+
+        for node1, node2, weight, i, j, present in checked:
+            if weight is None:
+                graph.remove_edge(node1, node2)
+            else:
+                graph.add_edge(node1, node2, weight=weight)
+                if self._spatial is not None and not present:
+                    self._spatial.note_edge(csr.distance(i, j))
+        changes = [change for change in applied.values() if change[2] != change[3]]
+        if not changes:
+            return 0
+
+        # Landmark bounds stay admissible when no distance can shrink
+        landmarks = self.landmarks if all(new >= old for _, _, old, new in changes) else None
+        trees = self.query_cache.trees.copy()
+        self.mark_modified()
+        self._csr = csr.with_edge_changes([(i, j, new) for i, j, _, new in changes])
+        self.landmarks = landmarks
+        for tree in trees.values():
+            tree.repair(self._csr, changes)
+        self.query_cache.trees.update(trees)
+        return len(changes)
+
+    def add_edge(self, node1, node2, weight=None):
+        if node1 in self.graph and node2 in self.graph:
+            x1, y1 = self.positions[node1]
+            x2, y2 = self.positions[node2]
+            if weight is None:
+                # Calculate Euclidean distance if no weight specified
+                weight = math.sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2)
+            self.graph.add_edge(node1, node2, weight=weight)
+            if self._spatial is not None:
+                self._spatial.note_edge(math.hypot(x1 - x2, y1 - y2))
+            self.mark_modified()
+
+    def _run_search(self, start_node, end_node, search, **kwargs):
+        # Run a CSRGraph search and translate its result back to node ids
+        self.last_error = None
+        self.last_stats = {}
+        try:
+            csr = self.csr
+            source, target = csr.indices(start_node, end_node)
+        except nx.NodeNotFound:
+            self.report_error("Selected nodes do not exist in the graph.")
+            return None, [], []
+        if not csr.connected(source, target):
+            # Different components: nothing to search
+            self.last_stats = {'settled': 0, 'unreachable': True}
+            self.report_error("No path exists between the nodes.")
+            return None, [], []
+
+        if self.progress is not None:
+            kwargs['progress'] = self._progress_callback(csr)
+        pushes, relaxed = self._search_work(csr)
+        path, order, frontier, *sides = search(csr, source, target, **kwargs)
+        self.last_stats = {
+            'settled': len(order),
+            'frontier_sizes': frontier,
+            'max_frontier': max(frontier, default=0),
+        }
+        self._add_work_stats(csr, pushes, relaxed)
+        if sides:
+            # Bidirectional searches also report which frontier settled each node
+            sides = sides[0]
+            self.last_stats['sides'] = sides
+            self.last_stats['settled_forward'] = sides.count(0)
+            self.last_stats['settled_backward'] = sides.count(1)
+        if path is None:
+            self.report_error("No path exists between the nodes.")
+            return None, [], []
+        return csr.to_nodes(path), csr.to_nodes(order), frontier
+
+    def _search_work(self, csr):
+        # Heap pushes and edge relaxations so far on the arrays and hierarchy
+        structures = [s for s in (csr, self.ch, self.compression and self.compression.graph) if s is not None]
+        return sum(s.heap_pushes for s in structures), sum(s.edges_relaxed for s in structures)
+
+    def _add_work_stats(self, csr, pushes, relaxed):
+        now_pushes, now_relaxed = self._search_work(csr)
+        self.last_stats['heap_pushes'] = now_pushes - pushes
+        self.last_stats['edges_relaxed'] = now_relaxed - relaxed
+
+    def _progress_callback(self, csr):
+        # Adapt self.progress to the CSR level progress(order, frontier)
+        reported = 0
+        callback = self.progress
+
+        def progress(order, frontier):
+            nonlocal reported
+            new_nodes = csr.to_nodes(order[reported:])
+            reported = len(order)
+            callback(reported, frontier[-1] if frontier else 0, new_nodes)
+        return progress
+
+    def _tree_search(self, csr, source, target, progress=None):
+        # Dijkstra through the cached tree of the source, resumed only if the
+        # target has not been settled by an earlier query
+        return self.query_cache.tree(csr, source).search(target, progress)
+
+    @cached_query("shortest_path")
+    def shortest_path(self, start_node, end_node):
+        path, _, _ = self._run_search(start_node, end_node, self._tree_search)
+        if path is None:
+            return set(), [], []
+        path_edges = list(zip(path, path[1:]))
+
+        # Modify to match other search method return signature
+        return set(path), path_edges, path
+
+    @cached_query("dijkstra")
+    def dijkstra(self, start_node, end_node):
+        path, order, _ = self._run_search(start_node, end_node, self._tree_search)
+        if path is None:
+            return set(), [], []
+        return set(path), list(zip(path, path[1:])), order
+
+    @cached_query("bfs")
+    def bfs(self, start_node, end_node):
+        path, order, _ = self._run_search(start_node, end_node, CSRGraph.bfs_search)
+        if path is None:
+            return set(), [], []
+        return set(path), list(zip(path, path[1:])), order
+
+    @cached_query("dfs")
+    def dfs(self, start_node, end_node):
+        path, order, _ = self._run_search(start_node, end_node, CSRGraph.dfs_search)
+        if path is None:
+            return set(), [], []
+        return set(path), list(zip(path, path[1:])), order
+
+    @cached_query("astar_search")
+    def astar_search(self, start_node, end_node, heuristic="euclidean"):
+        csr = self.csr
+        target = csr.index.get(end_node)
+
+        if heuristic == "alt":
+            # Landmark lower bounds; built with the default settings on first
+            # use, which can be cancelled like a search
+            landmarks = self.landmarks or self.build_landmarks(
+                progress=self.progress and self._progress_callback(csr))
+            estimate = landmarks.heuristic(target) if target is not None else None
+        else:
+            def estimate(i):
+                # Euclidean distance heuristic
+                return csr.distance(i, target)
+
+        path, order, _ = self._run_search(start_node, end_node, CSRGraph.dijkstra_search, heuristic=estimate)
+        if path is None:
+            return set(), [], []
+        return set(path), list(zip(path, path[1:])), order
+
+    def alt_search(self, start_node, end_node):
+        return self.astar_search(start_node, end_node, heuristic="alt")
+
+    @cached_query("ch_search")
+    def ch_search(self, start_node, end_node):
+        # Contraction Hierarchies query; preprocesses on first use if needed,
+        # which can be cancelled like a search
+        ch = self.ch or self.build_contraction_hierarchy(self.progress and self._progress_callback(self.csr))
+        path, order, _ = self._run_search(start_node, end_node,
+                                          lambda csr, s, t, progress=None: ch.query(s, t, progress))
+        if path is None:
+            return set(), [], []
+        return set(path), list(zip(path, path[1:])), order
+
+    @cached_query("chain_search")
+    def chain_search(self, start_node, end_node):
+        # Search on the graph with degree-2 chains contracted (built on first
+        # use, cancellable like a search); the path comes back expanded to
+        # every node along it. Plain
+        # Dijkstra, or A* on landmark bounds once landmarks are built: unlike
+        # the Euclidean estimate, both stay exact whatever the weights.
+        csr = self.csr
+        compression = self.compression or self.build_chain_compression(
+            self.progress and self._progress_callback(csr))
+        target = csr.index.get(end_node)
+        estimate = self.landmarks.heuristic(target) if self.landmarks is not None and target is not None else None
+
+        path, order, _ = self._run_search(
+            start_node, end_node,
+            lambda csr, s, t, progress=None: compression.search(s, t, estimate, progress))
+        if path is None:
+            return set(), [], []
+        return set(path), list(zip(path, path[1:])), order
+
+    @cached_query("lookup_path")
+    def lookup_path(self, start_node, end_node):
+        # Shortest path read from the all-pairs tables (build_all_pairs first),
+        # shaped like the search results with nothing settled
+        self.last_error = None
+        self.last_stats = {}
+        try:
+            csr = self.csr
+            source, target = csr.indices(start_node, end_node)
+        except nx.NodeNotFound:
+            self.report_error("Selected nodes do not exist in the graph.")
+            return set(), [], []
+        if self.all_pairs is None:
+            self.report_error("All-pairs tables are not built; run the analytics first.")
+            return set(), [], []
+        path = self.all_pairs.path(source, target)
+        self.last_stats = {'settled': 0, 'table_lookup': True,
+                           'distance': float(self.all_pairs.distances[source, target])}
+        if path is None:
+            self.report_error("No path exists between the nodes.")
+            return set(), [], []
+        path = csr.to_nodes(path)
+        return set(path), list(zip(path, path[1:])), []
+
+    def _run_routes(self, start_node, end_node, search, **kwargs):
+        # Run a multi-route search on the end node's cached tree. The result
+        # merges the routes: every route node, the edges of all routes in rank
+        # order and the settled order. The routes themselves, best first, are
+        # in last_stats.
+        self.last_error = None
+        self.last_stats = {}
+        try:
+            csr = self.csr
+            source, target = csr.indices(start_node, end_node)
+        except nx.NodeNotFound:
+            self.report_error("Selected nodes do not exist in the graph.")
+            return set(), [], []
+        if not csr.connected(source, target):
+            self.last_stats = {'settled': 0, 'unreachable': True}
+            self.report_error("No path exists between the nodes.")
+            return set(), [], []
+
+        if self.progress is not None:
+            kwargs['progress'] = self._progress_callback(csr)
+        pushes, relaxed = self._search_work(csr)
+        paths, lengths, order, truncated = search(csr, self.query_cache.tree(csr, target), source, target, **kwargs)
+        paths = [csr.to_nodes(path) for path in paths]
+        self.last_stats = {
+            'settled': len(order),
+            'paths': paths,
+            'path_lengths': lengths,
+            'truncated': truncated,
+        }
+        self._add_work_stats(csr, pushes, relaxed)
+        if not paths:
+            self.report_error("No path exists between the nodes.")
+            return set(), [], []
+        edges = [edge for path in paths for edge in zip(path, path[1:])]
+        return set().union(*paths), edges, csr.to_nodes(order)
+
+    @cached_query("k_shortest_paths")
+    def k_shortest_paths(self, start_node, end_node, k=3):
+        return self._run_routes(start_node, end_node, yen_k_shortest_paths, k=k)
+
+    @cached_query("alternative_routes")
+    def alternative_routes(self, start_node, end_node, k=3):
+        return self._run_routes(start_node, end_node, penalty_alternative_routes, k=k)
+
+    @cached_query("bidirectional_dijkstra")
+    def bidirectional_dijkstra(self, start_node, end_node):
+        path, order, _ = self._run_search(start_node, end_node, CSRGraph.bidirectional_search)
+        if path is None:
+            return set(), [], []
+        return set(path), list(zip(path, path[1:])), order
+
+    @cached_query("bidirectional_astar")
+    def bidirectional_astar(self, start_node, end_node):
+        csr = self.csr
+        source, target = csr.index.get(start_node), csr.index.get(end_node)
+
+        def potential(i):
+            # Average of the Euclidean heuristics towards the end and the start,
+            # so both directions see consistent reduced edge costs
+            return (csr.distance(i, target) - csr.distance(i, source)) / 2
+
+        path, order, _ = self._run_search(start_node, end_node, CSRGraph.bidirectional_search, potential=potential)
+        if path is None:
+            return set(), [], []
+        return set(path), list(zip(path, path[1:])), order
@@ -0,0 +1,309 @@
+import argparse
+import csv
+import itertools
+import math
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+from array import array
+import numpy as np
+import graph_core
+
+try:
+    import osmium
+except ImportError:
+    osmium = None
+
+
+# Bulk import of large networks. Files are read in chunks into flat arrays,
+# and the graph is built in one vectorized pass straight into the CSR search
+# arrays (GraphTool.set_csr) instead of one add_node/add_edge call per element.
+
+CHUNK_ROWS = 100000
+EARTH_RADIUS = 6371008.8  # meters
+
+NODE_COLUMNS = (('id', 'node', 'node_id'), ('x', 'lon', 'longitude'), ('y', 'lat', 'latitude'))
+EDGE_COLUMNS = (('source', 'u', 'from', 'node1'), ('target', 'v', 'to', 'node2'),
+                ('weight', 'length', 'cost', 'distance'))
+
+
+def _is_number(value):
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+def _rows(filename):
+    # Rows of a CSV or whitespace separated file, skipping blank and # lines
+    with open(filename, newline='') as f:
+        lines = (line for line in f if line.strip() and not line.lstrip().startswith('#'))
+        first = next(lines, None)
+        if first is None:
+            return
+        lines = itertools.chain([first], lines)
+        if ',' in first or '\t' in first:
+            yield from csv.reader(lines, delimiter=',' if ',' in first else '\t')
+        else:
+            for line in lines:
+                yield line.split()
+
+
+def _columns(header, names):
+    # Column index for each of names (alternative spellings), by position
+    # when there is no header or it does not name the column
+    if header is None:
+        return list(range(len(names)))
+    lowered = [column.strip().lower() for column in header]
+    found = []
+    for position, alternatives in enumerate(names):
+        found.append(next((lowered.index(name) for name in alternatives if name in lowered), position))
+    return found
+
+
+def read_table(filename, names, chunk_rows=CHUNK_ROWS, id_columns=1):
+    # Yield float64 arrays of up to chunk_rows rows with one column per entry
+    # of names. The first row is taken as a header when one of its first
+    # id_columns fields (the node ids) is not a number; other empty fields,
+    # like a missing weight, do not make it one. Missing trailing columns
+    # (e.g. no weight) come back as NaN.
+    rows = _rows(filename)
+    first = next(rows, None)
+    if first is None:
+        return
+    header = None if all(_is_number(value) for value in first[:id_columns]) else first
+    columns = _columns(header, names)
+    if header is None:
+        rows = itertools.chain([first], rows)
+
+    width = len(names)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_rows))
+        if not chunk:
+            return
+        table = np.full((len(chunk), width), np.nan)
+        for k, column in enumerate(columns):
+            values = [row[column] if column < len(row) and row[column] != '' else 'nan' for row in chunk]
+            table[:, k] = np.array(values, dtype=np.float64)
+        yield table
+
+
+def _concat(chunks, width):
+    chunks = list(chunks)
+    return np.concatenate(chunks) if chunks else np.empty((0, width))
+
+
+def build_csr(node_ids, coords, sources, targets, weights=None):
+    # One vectorized pass from node and edge arrays (edges given by node id).
+    # Edges with an unknown end, self loops and repeated edges are dropped
+    # (the first weight wins); missing or NaN weights become the Euclidean
+    # length. Returns the CSRGraph and the number of dropped edges.
+    node_ids = np.asarray(node_ids, dtype=np.int64)
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    order = np.argsort(node_ids, kind='stable')
+    node_ids, coords = node_ids[order], coords[order]
+    unique = np.ones(len(node_ids), dtype=bool)
+    unique[1:] = node_ids[1:] != node_ids[:-1]
+    node_ids, coords = node_ids[unique], coords[unique]
+
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    weights = np.full(len(sources), np.nan) if weights is None else np.asarray(weights, dtype=np.float64)
+    total = len(sources)
+
+    # Node ids -> CSR indices
+    i = np.searchsorted(node_ids, sources)
+    j = np.searchsorted(node_ids, targets)
+    n = len(node_ids)
+    known = (i < n) & (j < n)
+    known[known] &= (node_ids[i[known]] == sources[known]) & (node_ids[j[known]] == targets[known])
+    keep = known & (i != j)
+    i, j, weights = i[keep], j[keep], weights[keep]
+
+    # One entry per undirected edge
+    low, high = np.minimum(i, j), np.maximum(i, j)
+    _, first = np.unique(low * n + high, return_index=True)
+    first.sort()
+    low, high, weights = low[first], high[first], weights[first]
+
+    missing = np.isnan(weights)
+    if missing.any():
+        delta = coords[low[missing]] - coords[high[missing]]
+        weights[missing] = np.hypot(delta[:, 0], delta[:, 1])
+
+    csr = graph_core.CSRGraph.from_arrays(node_ids, coords, low, high, weights)
+    return csr, total - len(low)
+
+
+def fit_coords(coords, width, height, margin=20.0):
+    # Scale and shift coordinates into a width x height box, keeping aspect
+    if not len(coords):
+        return coords
+    low, high = coords.min(axis=0), coords.max(axis=0)
+    span = np.maximum(high - low, 1e-12)
+    scale = min((width - 2 * margin) / span[0], (height - 2 * margin) / span[1])
+    return (coords - low) * scale + margin
+
+
+def project(lon, lat):
+    # Equirectangular projection in meters around the mean latitude, y down
+    # like the canvas, with the top left corner of the area at the origin
+    lat0 = math.radians(float(np.mean(lat))) if len(lat) else 0.0
+    x = np.radians(lon) * EARTH_RADIUS * math.cos(lat0)
+    y = -np.radians(lat) * EARTH_RADIUS
+    coords = np.column_stack([x, y])
+    return coords - coords.min(axis=0) if len(coords) else coords
+
+
+def read_csv_graph(nodes_file, edges_file, chunk_rows=CHUNK_ROWS):
+    # (node_ids, coords, sources, targets, weights) from a node file with
+    # id,x,y and an edge list with source,target[,weight]
+    nodes = _concat(read_table(nodes_file, NODE_COLUMNS, chunk_rows), 3)
+    edges = _concat(read_table(edges_file, EDGE_COLUMNS, chunk_rows, id_columns=2), 3)
+    return (nodes[:, 0].astype(np.int64), nodes[:, 1:3],
+            edges[:, 0].astype(np.int64), edges[:, 1].astype(np.int64), edges[:, 2])
+
+
+def read_osm_xml(filename, highway_only=True):
+    # Stream an .osm XML extract: node coordinates and way segments.
+    # Elements are dropped once read, so memory stays at the flat arrays.
+    ids, lons, lats = array('q'), array('d'), array('d')
+    sources, targets = array('q'), array('q')
+    refs, highway = [], False
+    context = ET.iterparse(filename, events=('start', 'end'))
+    _, root = next(context)
+    for event, element in context:
+        if event != 'end':
+            continue
+        tag = element.tag
+        if tag == 'nd':
+            refs.append(int(element.get('ref')))
+        elif tag == 'tag':
+            highway = highway or element.get('k') == 'highway'
+        elif tag in ('node', 'way', 'relation'):
+            if tag == 'node':
+                ids.append(int(element.get('id')))
+                lons.append(float(element.get('lon')))
+                lats.append(float(element.get('lat')))
+            elif tag == 'way' and (highway or not highway_only):
+                sources.extend(refs[:-1])
+                targets.extend(refs[1:])
+            refs, highway = [], False
+            root.clear()
+    return (np.frombuffer(ids, dtype=np.int64), np.frombuffer(lons), np.frombuffer(lats),
+            np.frombuffer(sources, dtype=np.int64), np.frombuffer(targets, dtype=np.int64))
+
+
+def read_osm_pbf(filename, highway_only=True):
+    # Same as read_osm_xml for .osm.pbf files; needs the osmium package
+    if osmium is None:
+        raise ImportError("Reading .osm.pbf files needs the osmium package (pip install osmium)")
+    ids, lons, lats = array('q'), array('d'), array('d')
+    sources, targets = array('q'), array('q')
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, node):
+            if node.location.valid():
+                ids.append(node.id)
+                lons.append(node.location.lon)
+                lats.append(node.location.lat)
+
+        def way(self, way):
+            if highway_only and 'highway' not in way.tags:
+                return
+            refs = [node.ref for node in way.nodes]
+            sources.extend(refs[:-1])
+            targets.extend(refs[1:])
+
+    Handler().apply_file(filename)
+    return (np.frombuffer(ids, dtype=np.int64), np.frombuffer(lons), np.frombuffer(lats),
+            np.frombuffer(sources, dtype=np.int64), np.frombuffer(targets, dtype=np.int64))
+
+
+def read_osm_graph(filename, highway_only=True):
+    # OSM extract as (node_ids, coords, sources, targets, weights), keeping
+    # only nodes on the imported ways, renumbered 0..n-1, with coordinates in
+    # meters. Weights are left to build_csr (Euclidean lengths).
+    reader = read_osm_pbf if filename.endswith('.pbf') else read_osm_xml
+    ids, lons, lats, sources, targets = reader(filename, highway_only)
+    used = np.unique(np.concatenate([sources, targets]))
+    order = np.argsort(ids, kind='stable')
+    positions = np.searchsorted(ids[order], used)
+    positions = np.minimum(positions, max(len(ids) - 1, 0))
+    found = ids[order][positions] == used if len(ids) else np.zeros(len(used), dtype=bool)
+    used, rows = used[found], order[positions[found]]
+
+    # Renumber the used nodes; edges to nodes missing from the extract get an
+    # id no node has, so build_csr drops them
+    def renumber(refs):
+        index = np.minimum(np.searchsorted(used, refs), max(len(used) - 1, 0))
+        return np.where(used[index] == refs, index, -1) if len(used) else np.full(len(refs), -1)
+
+    sources, targets = renumber(sources), renumber(targets)
+    coords = project(lons[rows], lats[rows])
+    return np.arange(len(used)), coords, sources, targets, None
+
+
+def import_graph(graph_tool, nodes_file=None, edges_file=None, osm_file=None, fit=None,
+                 chunk_rows=CHUNK_ROWS, highway_only=True):
+    # Replace graph_tool's graph with an imported one. fit=(width, height)
+    # scales the coordinates into that box before edge lengths are computed.
+    # Returns throughput statistics.
+    started = time.perf_counter()
+    if osm_file:
+        node_ids, coords, sources, targets, weights = read_osm_graph(osm_file, highway_only)
+        size = os.path.getsize(osm_file)
+    else:
+        node_ids, coords, sources, targets, weights = read_csv_graph(nodes_file, edges_file, chunk_rows)
+        size = os.path.getsize(nodes_file) + os.path.getsize(edges_file)
+    parse_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if fit:
+        coords = fit_coords(coords, *fit)
+    csr, dropped = build_csr(node_ids, coords, sources, targets, weights)
+    graph_tool.set_csr(csr, int(csr.node_ids[-1]) + 1 if len(csr) else 0)
+    build_seconds = time.perf_counter() - started
+
+    total = parse_seconds + build_seconds
+    edges = len(csr.targets) // 2
+    return {
+        'nodes': len(csr),
+        'edges': edges,
+        'dropped_edges': dropped,
+        'bytes': size,
+        'parse_seconds': parse_seconds,
+        'build_seconds': build_seconds,
+        'edges_per_second': edges / total if total else None,
+        'megabytes_per_second': size / 1e6 / total if total else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import a large network into a binary .graph file.")
+    parser.add_argument('output', help=".graph file to write")
+    parser.add_argument('--nodes', help="node file: id,x,y per line")
+    parser.add_argument('--edges', help="edge list: source,target[,weight] per line (CSV or whitespace separated)")
+    parser.add_argument('--osm', help="OpenStreetMap .osm (XML) or .osm.pbf extract")
+    parser.add_argument('--all-ways', action='store_true', help="import every OSM way, not only highways")
+    parser.add_argument('--fit', nargs=2, type=float, metavar=('WIDTH', 'HEIGHT'),
+                        help="scale coordinates into this box, e.g. the 1200 600 map")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+    if not args.osm and not (args.nodes and args.edges):
+        parser.error("give --osm, or --nodes and --edges")
+
+    graph_tool = graph_core.GraphTool()
+    stats = import_graph(graph_tool, args.nodes, args.edges, args.osm, args.fit, args.chunk_rows,
+                         not args.all_ways)
+    graph_tool.save(args.output)
+    print(f"Imported {stats['nodes']} nodes and {stats['edges']} edges ({stats['dropped_edges']} dropped) "
+          f"in {stats['parse_seconds'] + stats['build_seconds']:.2f}s: "
+          f"{stats['edges_per_second']:.0f} edges/s, {stats['megabytes_per_second']:.1f} MB/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,50 +1,149 @@
+import math
+import os
+import queue
+import threading
+import time
 import tkinter as tk
 from tkinter import messagebox, simpledialog, filedialog, ttk
-import networkx as nx
 import matplotlib.pyplot as plt
+from collections import OrderedDict
 from PIL import Image, ImageTk
-import pickle
-import os
-import heapq
-import math
-
+import numpy as np
+import graph_core
+import graph_import
+
+
+class MapImageCache:
+    # Decoded and resized map images keyed by (path, mtime, size), so the main
+    # canvas and every visualization window share one decode per size and a
+    # changed file on disk is picked up. Least recently used entries are
+    # dropped once the images (and their Tk photos) exceed memory_budget bytes.
+    # prefetch() decodes in a background thread; get() waits for it if needed.
+
+    def __init__(self, memory_budget=64 * 1024 * 1024):
+        self.memory_budget = memory_budget
+        self.entries = OrderedDict()  # key -> [image, photo or None, bytes]
+        self.pending = {}  # key -> (done event, [image or exception])
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(path, size):
+        return os.path.abspath(path), os.stat(path).st_mtime_ns, tuple(size)
+
+    @staticmethod
+    def _decode(path, size):
+        with graph_core.profiler.timer("map.decode", file=path, size=list(size)):
+            image = Image.open(path)
+            # JPEG can decode straight at a reduced scale, which is most of the work
+            image.draft(image.mode, size)
+            return image.resize(size, Image.LANCZOS)
+
+    def _store(self, key, image):
+        with self.lock:
+            self.entries[key] = [image, None, image.width * image.height * len(image.getbands())]
+            self.entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        # Always keep the newest entry, even if it alone exceeds the budget
+        while len(self.entries) > 1 and sum(entry[2] for entry in self.entries.values()) > self.memory_budget:
+            self.entries.popitem(last=False)
+
+    def prefetch(self, path, size):
+        try:
+            key = self._key(path, size)
+        except OSError:
+            return
+        with self.lock:
+            if key in self.entries or key in self.pending:
+                return
+            done, result = threading.Event(), []
+            self.pending[key] = (done, result)
 
-class GraphTool:
-    def __init__(self):
-        self.graph = nx.Graph()
-        self.positions = {}
-        self.current_node = 0
-        self.map_path = "map.jpg"  # Default map path
-
-    def add_node(self, position):
-        self.graph.add_node(self.current_node, pos=position)
-        self.positions[self.current_node] = position
-        node_id = self.current_node
-        self.current_node += 1
-        return node_id
-
-    def add_edge(self, node1, node2, weight=None):
-        if node1 in self.graph and node2 in self.graph:
-            if weight is None:
-                # Calculate Euclidean distance if no weight specified
-                x1, y1 = self.positions[node1]
-                x2, y2 = self.positions[node2]
-                weight = math.sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2)
-            self.graph.add_edge(node1, node2, weight=weight)
+        def decode():
+            try:
+                result.append(self._decode(path, size))
+                self._store(key, result[0])
+            except Exception as e:
+                result.append(e)
+            finally:
+                with self.lock:
+                    self.pending.pop(key, None)
+                done.set()
+
+        threading.Thread(target=decode, daemon=True).start()
+
+    def get(self, path, size):
+        # Resized PIL image; raises FileNotFoundError like Image.open
+        key = self._key(path, size)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key][0]
+            pending = self.pending.get(key)
+        if pending is not None:
+            done, result = pending
+            done.wait()
+            if isinstance(result[0], Exception):
+                raise result[0]
+            return result[0]
+        image = self._decode(path, size)
+        self._store(key, image)
+        return image
+
+    def photo(self, path, size):
+        # Tk photo of the resized image, created once per entry. Tk objects
+        # belong to the main thread, so this is never done in prefetch().
+        image = self.get(path, size)
+        key = self._key(path, size)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return ImageTk.PhotoImage(image)
+            if entry[1] is None:
+                entry[1] = ImageTk.PhotoImage(image)
+                entry[2] += image.width * image.height * 4
+                self._evict()
+            return entry[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+map_cache = MapImageCache()
+
+
+class GraphTool(graph_core.GraphTool):
+    # GraphTool with Tk error dialogs and the traversal visualization window
+
+    def report_error(self, message):
+        super().report_error(message)
+        # Searches running in a worker thread only record the error; the
+        # window polling them shows it (Tk must only be used from its thread)
+        if threading.current_thread() is threading.main_thread():
+            messagebox.showerror("Error", message)
 
     def _path_visualization(self, path_type, start_node, search_func, map_image_path=None, end_node=None):
         if map_image_path is None:
             map_image_path = self.map_path
+        if self.progress is not None:
+            # The graph tool runs one search at a time
+            messagebox.showinfo("Search running", "Wait for the running search to finish or cancel it first.")
+            return None
+        if end_node is not None and not self.reachable(start_node, end_node):
+            # Different components, known without searching
+            self.report_error("No path exists between the nodes.")
+            return None
 
         def create_visualization_window():
+            setup_started = time.perf_counter()
             new_window = tk.Toplevel()
             new_window.title(f"{path_type} Visualization")
             new_window.geometry("1200x800")
 
             try:
-                map_image = Image.open(map_image_path)
-                map_image = map_image.resize((1200, 700), Image.LANCZOS)
-                map_photo = ImageTk.PhotoImage(map_image)
+                map_photo = map_cache.photo(map_image_path, (1200, 700))
             except FileNotFoundError:
                 messagebox.showerror("Error", "Map image not found!")
                 return
@@ -54,20 +153,17 @@ class GraphTool:
 
             canvas.create_image(0, 0, image=map_photo, anchor=tk.NW)
 
-            # Visualization algorithm
-            if end_node is not None:
-                result_nodes, result_edges, traversal_order = search_func(start_node, end_node)
-            else:
-                result_nodes, result_edges, traversal_order = search_func(start_node)
+            # Only what falls inside the window is drawn
+            visible_nodes, visible_edges = self.visible_elements(0, 0, 1200, 700)
 
-            # Draw all original nodes
-            for node, pos in self.positions.items():
-                x, y = pos
+            # Draw original nodes
+            for node in visible_nodes:
+                x, y = self.positions[node]
                 canvas.create_oval(x - 7, y - 7, x + 7, y + 7, fill="blue", outline="black")
                 canvas.create_text(x, y - 15, text=str(node), font=("Arial", 10))
 
-            # Draw all original edges with weights
-            for edge in self.graph.edges(data=True):
+            # Draw original edges with weights
+            for edge in visible_edges:
                 node1, node2, data = edge
                 x1, y1 = self.positions[node1]
                 x2, y2 = self.positions[node2]
@@ -79,177 +175,769 @@ class GraphTool:
                 canvas.create_text(mid_x, mid_y, text=f"{data.get('weight', ''):.2f}",
                                    font=("Arial", 8), fill="red")
 
+            # The canvas is new, so every item on it was created by the setup
+            self.profiler.record("visualization.setup", time.perf_counter() - setup_started, algorithm=path_type,
+                                 canvas_items=len(canvas.find_all()))
+
             # Create a label to show current traversal information
             info_label = tk.Label(new_window, text="", font=("Arial", 12))
             info_label.pack()
 
-            def animate_search(index=0):
-                if index < len(traversal_order):
-                    current_node = traversal_order[index]
-                    x, y = self.positions[current_node]
-
-                    # Update info label
-                    info_label.config(text=f"{path_type}: Exploring node {current_node}")
-
-                    # Highlight current node
-                    node_highlight = canvas.create_oval(x - 9, y - 9, x + 9, y + 9, fill="red", outline="black")
-                    node_text = canvas.create_text(x, y - 20, text=str(current_node),
-                                                   font=("Arial", 12, "bold"), fill="red")
-
-                    # Highlight path edges
-                    path_highlights = []
-                    for edge in result_edges:
-                        if current_node in edge:
-                            n1, n2 = edge
-                            x1, y1 = self.positions[n1]
-                            x2, y2 = self.positions[n2]
-                            path_edge = canvas.create_line(x1, y1, x2, y2, fill="green", width=4)
-                            path_highlights.append(path_edge)
-
-                    # Schedule next animation
-                    new_window.after(800, lambda: cleanup_highlights(node_highlight, node_text, path_highlights))
-                    new_window.after(800, animate_search, index + 1)
+            # Search progress, with a Cancel button while the search runs
+            progress_frame = tk.Frame(new_window)
+            progress_frame.pack()
+            progress_bar = ttk.Progressbar(progress_frame, length=400, maximum=max(len(self.csr), 1))
+            progress_bar.pack(side=tk.LEFT, padx=5)
+            cancel_button = tk.Button(progress_frame, text="Cancel")
+            cancel_button.pack(side=tk.LEFT, padx=5)
+            if search_func.__name__ in graph_core.INSTANT_SEARCHES:
+                cancel_button.config(state=tk.DISABLED)
+
+            result_nodes, result_edges, traversal_order = set(), [], []
+            frontier_sizes, sides, stats = [], [], {}
+            messages = queue.Queue()
+            cancelled = threading.Event()
+
+            def report_progress(settled, frontier, new_nodes):
+                # Runs in the worker: hand the new frontier snapshot to the window
+                if cancelled.is_set():
+                    raise graph_core.SearchCancelled()
+                messages.put(('progress', settled, frontier, new_nodes))
+
+            def run_search():
+                try:
+                    self.last_stats = {}
+                    if end_node is not None:
+                        result = search_func(start_node, end_node)
+                    else:
+                        result = search_func(start_node)
+                    messages.put(('done', result, self.last_stats, self.last_error))
+                except graph_core.SearchCancelled:
+                    messages.put(('cancelled',))
+                except Exception as e:
+                    messages.put(('failed', e))
+                finally:
+                    self.progress = None
+
+            def cancel_search():
+                cancelled.set()
+                cancel_button.config(state=tk.DISABLED)
+                info_label.config(text=f"{path_type}: cancelling...")
+
+            def close_window():
+                cancelled.set()
+                new_window.destroy()
+
+            def poll_search():
+                nonlocal result_nodes, result_edges, traversal_order, frontier_sizes, sides, stats
+                if not new_window.winfo_exists():
+                    return
+                while True:
+                    try:
+                        message = messages.get_nowait()
+                    except queue.Empty:
+                        new_window.after(50, poll_search)
+                        return
+                    if message[0] == 'progress':
+                        _, settled, frontier, new_nodes = message
+                        progress_bar['value'] = settled
+                        info_label.config(text=f"{path_type}: {settled} nodes settled (frontier: {frontier})")
+                        for node in new_nodes:
+                            x, y = self.positions[node]
+                            if 0 <= x <= 1200 and 0 <= y <= 700:
+                                canvas.create_oval(x - 3, y - 3, x + 3, y + 3, fill="pink", outline="",
+                                                   tags=("explored",))
+                        continue
+                    break
+
+                progress_frame.destroy()
+                canvas.delete("explored")
+                if message[0] == 'cancelled':
+                    info_label.config(text=f"{path_type} cancelled")
+                elif message[0] == 'failed':
+                    info_label.config(text=f"{path_type} failed")
+                    messagebox.showerror("Error", str(message[1]), parent=new_window)
+                else:
+                    (result_nodes, result_edges, traversal_order), stats, error = message[1:]
+                    frontier_sizes = stats.get('frontier_sizes', [])
+                    sides = stats.get('sides', [])
+                    if error:
+                        messagebox.showerror("Error", error, parent=new_window)
+                    animate_search()
+
+            def step_text(position):
+                # Label text for the last step drawn
+                if position == 0:
+                    return f"{path_type}: {len(traversal_order)} nodes to replay"
+                index = position - 1
+                info_text = f"{path_type}: Exploring node {traversal_order[index]}"
+                if index < len(sides):
+                    info_text += " from end" if sides[index] else " from start"
+                if index < len(frontier_sizes):
+                    info_text += f" (frontier: {frontier_sizes[index]})"
+                return info_text
+
+            def draw_final_state():
+                # Final state - highlight all path nodes and edges
+                info_text = f"{path_type} Complete - {len(traversal_order)} nodes expanded"
+                if stats.get('table_lookup'):
+                    info_text = f"{path_type} Complete - distance {stats['distance']:.2f}, read from the tables"
+                if sides:
+                    info_text += (f" ({stats['settled_forward']} from start, "
+                                  f"{stats['settled_backward']} from end)")
+                if 'path_lengths' in stats:
+                    lengths = ", ".join(f"{length:.2f}" for length in stats['path_lengths'])
+                    info_text += f" - {len(stats['path_lengths'])} routes: {lengths}"
+                    if stats['truncated']:
+                        info_text += " (search limit reached)"
+                info_label.config(text=info_text)
+
+                # Highlight final path edges
+                for edge in result_edges:
+                    n1, n2 = edge
+                    x1, y1 = self.positions[n1]
+                    x2, y2 = self.positions[n2]
+                    canvas.create_line(x1, y1, x2, y2, fill="green", width=5, tags=("final",))
+
+                for node in result_nodes:
+                    x, y = self.positions[node]
+                    if node == end_node and path_type == "A* Search":
+                        # Special star mark for A* end node
+                        canvas.create_polygon(
+                            x, y - 15, x + 5, y - 5, x + 15, y - 5, x + 8, y + 5,
+                               x + 12, y + 15, x, y + 10, x - 12, y + 15, x - 8, y + 5,
+                               x - 15, y - 5, x - 5, y - 5,
+                            fill="gold", outline="black", tags=("final",)
+                        )
+                    else:
+                        canvas.create_oval(x - 7, y - 7, x + 7, y + 7, fill="gold", outline="black", tags=("final",))
+                    canvas.create_text(x, y - 15, text=str(node), font=("Arial", 10, "bold"), tags=("final",))
+
+            def animate_search():
+                # Playback controls: play/pause, seek, speed and skip to end
+                controls = tk.Frame(new_window)
+                controls.pack()
+                play_button = tk.Button(controls, text="Pause", width=6)
+                play_button.pack(side=tk.LEFT, padx=5)
+                seeking = False
+
+                def seek(value):
+                    if not seeking:
+                        animation.seek(float(value))
+                        update_controls()
+
+                seek_scale = ttk.Scale(controls, from_=0, to=len(traversal_order), length=500, command=seek)
+                seek_scale.pack(side=tk.LEFT, padx=5)
+                speed_label = tk.Label(controls, width=14)
+
+                def update_controls():
+                    play_button.config(text="Pause" if animation.playing else "Play")
+                    speed_label.config(text=f"{animation.speed:.0f} steps/s")
+
+                def on_frame(position):
+                    nonlocal seeking
+                    seeking = True
+                    seek_scale.set(position)
+                    seeking = False
+                    info_label.config(text=step_text(position))
+
+                def on_finish():
+                    # Wall time of the playback, pauses included
+                    self.profiler.record("visualization.playback", time.perf_counter() - playback_started,
+                                         algorithm=path_type, steps=len(traversal_order))
+                    with self.profiler.timer("visualization.final", algorithm=path_type) as fields:
+                        draw_final_state()
+                        fields['canvas_items'] = len(canvas.find_withtag("final"))
+                    update_controls()
+
+                def toggle_play():
+                    if animation.playing:
+                        animation.pause()
+                    else:
+                        animation.play()
+                    update_controls()
+
+                def change_speed(factor):
+                    animation.speed = min(max(animation.speed * factor, 0.5), 100000)
+                    update_controls()
+
+                playback_started = time.perf_counter()
+                animation = TraversalAnimation(canvas, self.positions, traversal_order, result_edges, sides,
+                                               bounds=(0, 0, 1200, 700), on_frame=on_frame, on_finish=on_finish)
+                play_button.config(command=toggle_play)
+                tk.Button(controls, text="Slower", command=lambda: change_speed(0.5)).pack(side=tk.LEFT, padx=5)
+                tk.Button(controls, text="Faster", command=lambda: change_speed(2)).pack(side=tk.LEFT, padx=5)
+                speed_label.pack(side=tk.LEFT, padx=5)
+                tk.Button(controls, text="Skip to End",
+                          command=lambda: (animation.skip_to_end(), update_controls())).pack(side=tk.LEFT, padx=5)
+
+                if traversal_order:
+                    animation.play()
                 else:
-                    # Final state - highlight all path nodes and edges
-                    info_label.config(text=f"{path_type} Complete")
-                    for node in result_nodes:
-                        x, y = self.positions[node]
-                        if node == end_node and path_type == "A* Search":
-                            # Special star mark for A* end node
-                            canvas.create_polygon(
-                                x, y - 15, x + 5, y - 5, x + 15, y - 5, x + 8, y + 5,
-                                   x + 12, y + 15, x, y + 10, x - 12, y + 15, x - 8, y + 5,
-                                   x - 15, y - 5, x - 5, y - 5,
-                                fill="gold", outline="black"
-                            )
-                        else:
-                            canvas.create_oval(x - 7, y - 7, x + 7, y + 7, fill="gold", outline="black")
-                        canvas.create_text(x, y - 15, text=str(node), font=("Arial", 10, "bold"))
-
-                    # Highlight final path edges
-                    for edge in result_edges:
-                        n1, n2 = edge
-                        x1, y1 = self.positions[n1]
-                        x2, y2 = self.positions[n2]
-                        canvas.create_line(x1, y1, x2, y2, fill="green", width=5)
-
-            def cleanup_highlights(node_highlight, node_text, path_highlights):
-                canvas.delete(node_highlight)
-                canvas.delete(node_text)
-                for edge in path_highlights:
-                    canvas.delete(edge)
-
-            # Start animation
-            animate_search()
+                    animation.skip_to_end()
+                update_controls()
+
+            # Search in a worker thread so a long search does not freeze the UI;
+            # the window polls its progress and animates the result once done
+            cancel_button.config(command=cancel_search)
+            new_window.protocol("WM_DELETE_WINDOW", close_window)
+            self.progress = report_progress
+            threading.Thread(target=run_search, daemon=True).start()
+            poll_search()
 
             canvas.image = map_photo
             return new_window
 
         return create_visualization_window()
 
-    def shortest_path(self, start_node, end_node):
-        try:
-            # Use networkx shortest_path with edge weights
-            path = nx.shortest_path(self.graph, source=start_node, target=end_node, weight='weight')
-            path_edges = list(zip(path, path[1:]))
-
-            # Modify to match other search method return signature
-            return set(path), path_edges, path
-        except nx.NetworkXNoPath:
-            messagebox.showerror("Error", "No path exists between the nodes.")
-            return set(), [], []
-        except nx.NodeNotFound:
-            messagebox.showerror("Error", "Selected nodes do not exist in the graph.")
-            return set(), [], []
-
-    def dijkstra(self, start_node, end_node):
-        try:
-            # Use Dijkstra's algorithm with path tracking
-            path = nx.dijkstra_path(self.graph, source=start_node, target=end_node, weight='weight')
-            path_edges = list(zip(path, path[1:]))
-
-            # Get full traversal order
-            # Modify to handle traversal order correctly
-            traversal_order = [start_node]
-            visited = set([start_node])
-
-            # Use a queue for BFS-like traversal to capture order
-            queue = [start_node]
-            while queue:
-                current = queue.pop(0)
-                for neighbor in self.graph.neighbors(current):
-                    if neighbor not in visited:
-                        visited.add(neighbor)
-                        queue.append(neighbor)
-                        traversal_order.append(neighbor)
-
-            return set(path), path_edges, traversal_order
-        except nx.NetworkXNoPath:
-            messagebox.showerror("Error", "No path exists between the nodes.")
-            return set(), [], []
-        except nx.NodeNotFound:
-            messagebox.showerror("Error", "Selected nodes do not exist in the graph.")
-            return set(), [], []
-
-    def bfs(self, start_node, end_node):
-        try:
-            # Breadth-First Search
-            path = list(nx.shortest_path(self.graph, source=start_node, target=end_node))
-            path_edges = list(zip(path, path[1:]))
-
-            # Full traversal order
-            traversal_order = list(nx.bfs_edges(self.graph, source=start_node))
-            traversal_nodes = [start_node] + [edge[1] for edge in traversal_order if edge[0] == start_node]
-
-            return set(path), path_edges, traversal_nodes
-        except nx.NetworkXNoPath:
-            messagebox.showerror("Error", "No path exists between the nodes.")
-            return set(), [], []
-        except nx.NodeNotFound:
-            messagebox.showerror("Error", "Selected nodes do not exist in the graph.")
-            return set(), [], []
-
-    def dfs(self, start_node, end_node):
+    def _isochrone_visualization(self, sources, budget, map_image_path=None):
+        # Reachable area of one or more sources within budget: reached edges
+        # and nodes colored by the cost from the nearest source, boundary edges
+        # drawn as far as the budget lasts
+        if map_image_path is None:
+            map_image_path = self.map_path
+        isochrones = self.isochrones(sources, budget)
+
+        # Union over the sources, keeping the nearest one's cost
+        reached = {}
+        for nodes, _ in isochrones:
+            for node, d in nodes.items():
+                if d < reached.get(node, math.inf):
+                    reached[node] = d
+
+        new_window = tk.Toplevel()
+        new_window.title("Isochrone Visualization")
+        new_window.geometry("1200x800")
         try:
-            # Depth-First Search
-            path = list(nx.shortest_path(self.graph, source=start_node, target=end_node))
-            path_edges = list(zip(path, path[1:]))
-
-            # Full traversal order
-            traversal_order = list(nx.dfs_edges(self.graph, source=start_node))
-            traversal_nodes = [start_node] + [edge[1] for edge in traversal_order if edge[0] == start_node]
-
-            return set(path), path_edges, traversal_nodes
-        except nx.NetworkXNoPath:
-            messagebox.showerror("Error", "No path exists between the nodes.")
-            return set(), [], []
-        except nx.NodeNotFound:
-            messagebox.showerror("Error", "Selected nodes do not exist in the graph.")
-            return set(), [], []
-
-    def astar_search(self, start_node, end_node):
-        def heuristic(a, b):
-            # Euclidean distance heuristic
-            x1, y1 = self.positions[a]
-            x2, y2 = self.positions[b]
-            return math.sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2)
+            map_photo = map_cache.photo(map_image_path, (1200, 700))
+        except FileNotFoundError:
+            messagebox.showerror("Error", "Map image not found!")
+            return None
 
-        try:
-            path = nx.astar_path(self.graph, source=start_node, target=end_node,
-                                 weight='weight', heuristic=heuristic)
-            path_edges = list(zip(path, path[1:]))
+        canvas = tk.Canvas(new_window, width=1200, height=700, bg="white")
+        canvas.pack()
+        canvas.create_image(0, 0, image=map_photo, anchor=tk.NW)
+        canvas.image = map_photo
+
+        visible_nodes, visible_edges = self.visible_elements(0, 0, 1200, 700)
+        for node1, node2, _ in visible_edges:
+            (x1, y1), (x2, y2) = self.positions[node1], self.positions[node2]
+            if node1 in reached and node2 in reached:
+                color = budget_color(max(reached[node1], reached[node2]) / budget if budget else 1.0)
+                canvas.create_line(x1, y1, x2, y2, fill=color, width=5)
+            else:
+                canvas.create_line(x1, y1, x2, y2, fill="orange", width=2)
+
+        # Partial edges out of the area, up to where the budget runs out
+        for _, boundary in isochrones:
+            for node1, node2, fraction in boundary:
+                if node2 in reached:
+                    continue
+                (x1, y1), (x2, y2) = self.positions[node1], self.positions[node2]
+                canvas.create_line(x1, y1, x1 + (x2 - x1) * fraction, y1 + (y2 - y1) * fraction,
+                                   fill="red", width=5)
+
+        for node in visible_nodes:
+            x, y = self.positions[node]
+            if node in sources:
+                canvas.create_oval(x - 9, y - 9, x + 9, y + 9, fill="gold", outline="black", width=2)
+            elif node in reached:
+                color = budget_color(reached[node] / budget if budget else 1.0)
+                canvas.create_oval(x - 7, y - 7, x + 7, y + 7, fill=color, outline="black")
+            else:
+                canvas.create_oval(x - 5, y - 5, x + 5, y + 5, fill="blue", outline="black")
+            canvas.create_text(x, y - 15, text=str(node), font=("Arial", 10))
+
+        source_text = ", ".join(map(str, sources))
+        tk.Label(new_window, text=f"{len(reached)} nodes reachable from {source_text} within a cost of {budget:g}",
+                 font=("Arial", 12)).pack()
+        return new_window
+
+
+def budget_color(fraction):
+    # Green at the source through yellow to red at the edge of the budget
+    fraction = min(max(fraction, 0.0), 1.0)
+    red = int(255 * min(2 * fraction, 1))
+    green = int(255 * min(2 * (1 - fraction), 1))
+    return f"#{red:02x}{green:02x}00"
+
+
+def centrality_color(fraction):
+    # Blue for the least central nodes through purple to red for the most
+    fraction = min(max(fraction, 0.0), 1.0)
+    return f"#{int(255 * fraction):02x}00{int(255 * (1 - fraction)):02x}"
+
+
+class TraversalAnimation:
+    # Playback of a search traversal on a canvas. The draw operations of every
+    # step are worked out up front; each frame (fps per second) then draws as
+    # many steps as the speed in steps per second calls for, so long traversals
+    # replay in seconds. Playback can be paused, sought in both directions and
+    # skipped to the end, where on_finish draws the final state.
+    fps = 30
+
+    def __init__(self, canvas, positions, order, path_edges, sides=(), bounds=None,
+                 on_frame=None, on_finish=None):
+        self.canvas = canvas
+        self.order = order
+        self.on_frame = on_frame
+        self.on_finish = on_finish
+        self.speed = max(2.0, len(order) / 10)  # whole traversal in about ten seconds
+        self.position = 0  # number of steps drawn
+        self.playing = False
+        self.finished = False
+        self._job = None
+        self._last_time = None
+        self._carry = 0.0
+        self._items = []  # canvas items drawn by each step so far
+
+        # Path edges appear with the first visit of either end
+        first_visit = {}
+        for index, node in enumerate(order):
+            first_visit.setdefault(node, index)
+        lines = [[] for _ in order]
+        for node1, node2 in path_edges:
+            index = min(first_visit.get(node1, len(order)), first_visit.get(node2, len(order)))
+            if index < len(order):
+                lines[index].append((*positions[node1], *positions[node2]))
+
+        # (position or None when outside bounds, color, path edge lines) per step
+        self.steps = []
+        for index, node in enumerate(order):
+            x, y = positions[node]
+            visible = bounds is None or (bounds[0] <= x <= bounds[2] and bounds[1] <= y <= bounds[3])
+            # Nodes settled by the backward frontier of bidirectional searches in purple
+            color = "purple" if index < len(sides) and sides[index] else "red"
+            self.steps.append(((x, y) if visible else None, color, lines[index]))
+
+        # Current node marker, moved rather than redrawn
+        self._marker = canvas.create_oval(0, 0, 0, 0, outline="black", width=2, state=tk.HIDDEN)
+
+    def _draw_step(self, index):
+        position, color, lines = self.steps[index]
+        items = [self.canvas.create_line(*line, fill="green", width=4) for line in lines]
+        if position is not None:
+            x, y = position
+            items.append(self.canvas.create_oval(x - 4, y - 4, x + 4, y + 4, fill=color, outline=""))
+        self._items.append(items)
+
+    def _undo_step(self):
+        for item in self._items.pop():
+            self.canvas.delete(item)
+
+    def seek(self, position):
+        position = min(max(int(position), 0), len(self.steps))
+        if self.finished and position < len(self.steps):
+            self.canvas.delete("final")
+            self.finished = False
+        while self.position < position:
+            self._draw_step(self.position)
+            self.position += 1
+        while self.position > position:
+            self._undo_step()
+            self.position -= 1
+
+        current = self.steps[position - 1] if position else None
+        if current is None or current[0] is None or position == len(self.steps):
+            self.canvas.itemconfigure(self._marker, state=tk.HIDDEN)
+        else:
+            x, y = current[0]
+            self.canvas.coords(self._marker, x - 9, y - 9, x + 9, y + 9)
+            self.canvas.itemconfigure(self._marker, state=tk.NORMAL, fill=current[1])
+            self.canvas.tag_raise(self._marker)
+        if self.on_frame:
+            self.on_frame(self.position)
+        if position == len(self.steps) and not self.finished:
+            self._finish()
+
+    def _finish(self):
+        self.pause()
+        self.finished = True
+        if self.on_finish:
+            self.on_finish()
+
+    def play(self):
+        if self.finished:
+            self.seek(0)
+        self.playing = True
+        self._last_time = time.perf_counter()
+        self._carry = 0.0
+        self._schedule()
+
+    def pause(self):
+        self.playing = False
+        if self._job is not None:
+            self.canvas.after_cancel(self._job)
+            self._job = None
+
+    def skip_to_end(self):
+        self.pause()
+        self.seek(len(self.steps))
+
+    def _schedule(self):
+        self._job = self.canvas.after(max(int(1000 / self.fps), 1), self._tick)
+
+    def _tick(self):
+        self._job = None
+        if not self.playing or not self.canvas.winfo_exists():
+            return
+        now = time.perf_counter()
+        self._carry += (now - self._last_time) * self.speed
+        self._last_time = now
+        steps = int(self._carry)
+        self._carry -= steps
+        if steps:
+            self.seek(self.position + steps)
+        if self.playing:
+            self._schedule()
+
+
+class ViewTransform:
+    # Zoom and pan of the main canvas: screen = world * zoom + offset, where
+    # world coordinates are the ones stored in GraphTool.positions
+    min_zoom = 0.05
+    max_zoom = 8.0
+
+    def __init__(self):
+        self.zoom = 1.0
+        self.offset_x = 0.0
+        self.offset_y = 0.0
+
+    def to_screen(self, x, y):
+        return x * self.zoom + self.offset_x, y * self.zoom + self.offset_y
+
+    def to_world(self, x, y):
+        return (x - self.offset_x) / self.zoom, (y - self.offset_y) / self.zoom
+
+    def zoom_at(self, factor, x, y):
+        # Zoom around the screen point (x, y), which stays over the same spot
+        world_x, world_y = self.to_world(x, y)
+        self.zoom = min(max(self.zoom * factor, self.min_zoom), self.max_zoom)
+        self.offset_x = x - world_x * self.zoom
+        self.offset_y = y - world_y * self.zoom
+
+    def pan(self, dx, dy):
+        self.offset_x += dx
+        self.offset_y += dy
+
+
+class MapTiles:
+    # Background map as an image pyramid (each level half the size of the one
+    # before) cut into square tiles. Only tiles intersecting the view are
+    # resampled, from the level closest to the current zoom; their PhotoImages
+    # are reused while panning until the zoom changes.
+    tile_size = 256
+
+    def __init__(self, image):
+        self.levels = [image]
+        with graph_core.profiler.timer("map.pyramid") as fields:
+            while max(self.levels[-1].size) > self.tile_size:
+                width, height = self.levels[-1].size
+                self.levels.append(self.levels[-1].resize((max(1, width // 2), max(1, height // 2)), Image.LANCZOS))
+            fields['levels'] = len(self.levels)
+        self.width, self.height = image.size
+        self.zoom = None
+        self.photos = {}
+
+    def visible_tiles(self, view, width, height):
+        # (x, y, PhotoImage) of every tile on screen, x/y being its top left corner
+        if view.zoom != self.zoom:
+            self.zoom = view.zoom
+            self.photos.clear()
+        zoom = view.zoom
+        level = min(max(int(math.floor(math.log2(1 / zoom))), 0), len(self.levels) - 1) if zoom < 1 else 0
+        scale = 2 ** level
+        image = self.levels[level]
+        span = self.tile_size * scale  # world pixels covered by one tile
+
+        left, top = view.to_world(0, 0)
+        right, bottom = view.to_world(width, height)
+        first_x, last_x = max(int(left // span), 0), min(int(right // span), (self.width - 1) // span)
+        first_y, last_y = max(int(top // span), 0), min(int(bottom // span), (self.height - 1) // span)
+        origin_x, origin_y = round(view.offset_x), round(view.offset_y)
+
+        tiles = []
+        for tx in range(first_x, last_x + 1):
+            for ty in range(first_y, last_y + 1):
+                x0, y0 = round(tx * span * zoom), round(ty * span * zoom)
+                key = (level, tx, ty)
+                if key not in self.photos:
+                    box = (tx * self.tile_size, ty * self.tile_size,
+                           min((tx + 1) * self.tile_size, image.width), min((ty + 1) * self.tile_size, image.height))
+                    # Size from the rounded tile edges so neighbouring tiles meet exactly
+                    size = (max(round(min((tx + 1) * span, self.width) * zoom) - x0, 1),
+                            max(round(min((ty + 1) * span, self.height) * zoom) - y0, 1))
+                    self.photos[key] = ImageTk.PhotoImage(image.crop(box).resize(size, Image.LANCZOS))
+                tiles.append((x0 + origin_x, y0 + origin_y, self.photos[key]))
+        return tiles
+
+
+class CanvasRenderer:
+    # Retained-mode drawing of the main canvas. Canvas item ids are kept per
+    # node and per edge (tagged "node"/"node:<id>" and "edge"/"edge:<a>-<b>",
+    # plus "graph" for everything but the map), so edits create or update only
+    # their own items. Only the visible region is drawn; sync() brings the items
+    # in line after it changes.
+    #
+    # Level of detail, by zoom factor: edge weights are hidden below
+    # weight_label_zoom, node ids below node_label_zoom, and below cluster_zoom
+    # (or with more than max_nodes nodes in view, as after a bulk import)
+    # nodes sharing a cluster_cell sized screen square are merged into one
+    # aggregate marker showing how many nodes it stands for.
+    #
+    # color_nodes() fills nodes by a per-node color (centrality) until the
+    # graph is next edited.
+    weight_label_zoom = 0.8
+    node_label_zoom = 0.5
+    cluster_zoom = 0.35
+    cluster_cell = 16
+    max_nodes = 3000
+    max_links = 8000
+    margin = 20
+
+    def __init__(self, canvas, graph_tool, view):
+        self.canvas = canvas
+        self.graph_tool = graph_tool
+        self.view = view
+        self.map_tiles = None
+        self.node_items = {}
+        self.edge_items = {}
+        self.region = None
+        self.clustering = False
+        self.node_colors = {}
+        self.colors_version = None
+        self._cluster_cache = None  # ((zoom bucket, graph version), clusters)
+
+    @staticmethod
+    def _edge_key(node1, node2):
+        return (node1, node2) if node1 <= node2 else (node2, node1)
+
+    def _screen_size(self):
+        width = max(self.canvas.winfo_width(), int(self.canvas['width']))
+        height = max(self.canvas.winfo_height(), int(self.canvas['height']))
+        return width, height
+
+    def visible_region(self):
+        # World rectangle on screen, with a margin so labels at the border show
+        width, height = self._screen_size()
+        x0, y0 = self.view.to_world(-self.margin, -self.margin)
+        x1, y1 = self.view.to_world(width + self.margin, height + self.margin)
+        return x0, y0, x1, y1
+
+    def _in_region(self, x0, y0, x1, y1):
+        rx0, ry0, rx1, ry1 = self.region
+        return min(x0, x1) <= rx1 and max(x0, x1) >= rx0 and min(y0, y1) <= ry1 and max(y0, y1) >= ry0
+
+    def _node_fill(self, node):
+        return self.node_colors.get(node, "blue")
+
+    def color_nodes(self, colors):
+        self.node_colors = colors
+        self.colors_version = self.graph_tool.version
+        for node, items in self.node_items.items():
+            self.canvas.itemconfigure(items[0], fill=self._node_fill(node))
+
+    def _drop_stale_colors(self):
+        # Colors describe the graph they were computed for
+        if self.node_colors and self.colors_version != self.graph_tool.version:
+            self.color_nodes({})
+
+    def _create_node(self, node):
+        x, y = self.view.to_screen(*self.graph_tool.positions[node])
+        tags = ("graph", "node", f"node:{node}")
+        items = [self.canvas.create_oval(x - 7, y - 7, x + 7, y + 7, fill=self._node_fill(node), outline="black",
+                                         tags=tags)]
+        if self.view.zoom >= self.node_label_zoom:
+            items.append(self.canvas.create_text(x, y - 15, text=str(node), font=("Arial", 10), tags=tags))
+        self.node_items[node] = tuple(items)
+
+    def _create_edge(self, key, data):
+        node1, node2 = key
+        x1, y1 = self.view.to_screen(*self.graph_tool.positions[node1])
+        x2, y2 = self.view.to_screen(*self.graph_tool.positions[node2])
+        tags = ("graph", "edge", f"edge:{node1}-{node2}")
+
+        # Draw edge
+        items = [self.canvas.create_line(x1, y1, x2, y2, fill="orange", width=3, tags=tags)]
+
+        # Draw weight
+        if self.view.zoom >= self.weight_label_zoom:
+            mid_x = (x1 + x2) / 2
+            mid_y = (y1 + y2) / 2
+            items.append(self.canvas.create_text(mid_x, mid_y,
+                                                 text=f"{data.get('weight', ''):.2f}",
+                                                 font=("Arial", 8),
+                                                 fill="red",
+                                                 tags=tags))
+        self.edge_items[key] = tuple(items)
+
+    def _delete(self, items):
+        for item in items:
+            self.canvas.delete(item)
+
+    def _draw_map(self):
+        self.canvas.delete("map")
+        if self.map_tiles is None:
+            return
+        for x, y, photo in self.map_tiles.visible_tiles(self.view, *self._screen_size()):
+            self.canvas.create_image(x, y, image=photo, anchor=tk.NW, tags=("map",))
+        self.canvas.tag_lower("map")
 
-            # Tracking traversal order is complex for A*, so we'll use path as traversal order
-            return set(path), path_edges, path
-        except nx.NetworkXNoPath:
-            messagebox.showerror("Error", "No path exists between the nodes.")
-            return set(), [], []
-        except nx.NodeNotFound:
-            messagebox.showerror("Error", "Selected nodes do not exist in the graph.")
-            return set(), [], []
+    def redraw(self, map_tiles=None):
+        # Full redraw, needed when the whole graph or the view scale changed
+        self.map_tiles = map_tiles
+        self.canvas.delete("all")
+        self.node_items.clear()
+        self.edge_items.clear()
+        self._draw_map()
+        self.sync()
+
+    def sync(self):
+        self._drop_stale_colors()
+        self.region = self.visible_region()
+        self.clustering = self.view.zoom < self.cluster_zoom or self._count_visible() > self.max_nodes
+        if self.clustering:
+            self._draw_clusters()
+            return
+        self.canvas.delete("cluster")
+
+        nodes, edges = self.graph_tool.visible_elements(*self.region)
+
+        visible_nodes = set(nodes)
+        visible_edges = {self._edge_key(node1, node2): data for node1, node2, data in edges}
+
+        for node in [node for node in self.node_items if node not in visible_nodes]:
+            self._delete(self.node_items.pop(node))
+        for key in [key for key in self.edge_items if key not in visible_edges]:
+            self._delete(self.edge_items.pop(key))
+
+        for node in nodes:
+            if node not in self.node_items:
+                self._create_node(node)
+        for key, data in visible_edges.items():
+            if key not in self.edge_items:
+                self._create_edge(key, data)
+
+    def _count_visible(self):
+        # Nodes in the visible region, only counted for large graphs
+        if self.graph_tool.node_count() <= self.max_nodes:
+            return 0
+        return self.graph_tool.count_in_rect(*self.region)
+
+    def _clusters(self):
+        # Cells for the current zoom bucket (quarter octaves), with the mean
+        # position and node count of each and the cell pairs joined by edges,
+        # busiest first. Kept in world coordinates, so panning reuses them;
+        # recomputed only when the zoom bucket or the graph version changes.
+        bucket = round(math.log2(self.view.zoom) * 4)
+        key = (bucket, self.graph_tool.version)
+        if self._cluster_cache is not None and self._cluster_cache[0] == key:
+            return self._cluster_cache[1]
+        csr = self.graph_tool.csr
+        world = np.asarray(csr.coords)
+        cells = np.floor(world * (2 ** (bucket / 4) / self.cluster_cell)).astype(np.int64)
+        cell_keys, node_cell, counts = np.unique(cells[:, 0] * (1 << 32) + cells[:, 1],
+                                                 return_inverse=True, return_counts=True)
+        centers = np.column_stack([np.bincount(node_cell, world[:, 0]) / counts,
+                                   np.bincount(node_cell, world[:, 1]) / counts])
+
+        sources = np.repeat(np.arange(len(csr)), np.diff(csr.offsets))
+        targets = np.asarray(csr.targets)
+        between = (sources < targets) & (node_cell[sources] != node_cell[targets])
+        sources, targets = node_cell[sources[between]], node_cell[targets[between]]
+        pairs, links = np.unique(np.minimum(sources, targets) * len(cell_keys) + np.maximum(sources, targets),
+                                 return_counts=True)
+        pairs = pairs[np.argsort(-links, kind='stable')]
+        clusters = (centers, counts, pairs // max(len(cell_keys), 1), pairs % max(len(cell_keys), 1))
+        self._cluster_cache = (key, clusters)
+        return clusters
+
+    def _draw_clusters(self):
+        # Aggregated view when zoomed far out: one marker per visible cell and
+        # at most one line per pair of connected cells with a visible end,
+        # only the max_links busiest pairs. The clustering itself is cached,
+        # so a pan only filters and places it.
+        self.canvas.delete("graph")
+        self.node_items.clear()
+        self.edge_items.clear()
+        if not len(self.graph_tool.csr):
+            return
+        centers, counts, low, high = self._clusters()
+        x0, y0, x1, y1 = self.region
+        visible = (centers[:, 0] >= x0) & (centers[:, 0] <= x1) & (centers[:, 1] >= y0) & (centers[:, 1] <= y1)
+        screen = centers * self.view.zoom + (self.view.offset_x, self.view.offset_y)
+
+        shown = np.flatnonzero(visible[low] | visible[high])[:self.max_links]
+        for (ax, ay), (bx, by) in zip(screen[low[shown]].tolist(), screen[high[shown]].tolist()):
+            self.canvas.create_line(ax, ay, bx, by, fill="orange", width=1, tags=("graph", "cluster"))
+
+        for (x, y), count in zip(screen[visible].tolist(), counts[visible].tolist()):
+            if count == 1:
+                self.canvas.create_oval(x - 3, y - 3, x + 3, y + 3, fill="blue", outline="black",
+                                        tags=("graph", "cluster"))
+                continue
+            radius = min(4 + 2 * math.log2(count), 14)
+            self.canvas.create_oval(x - radius, y - radius, x + radius, y + radius, fill="navy", outline="black",
+                                    tags=("graph", "cluster"))
+            self.canvas.create_text(x, y, text=str(count), font=("Arial", 7), fill="white",
+                                    tags=("graph", "cluster"))
+
+    def zoom(self, factor, x, y):
+        self.view.zoom_at(factor, x, y)
+        # Item sizes and the level of detail depend on the zoom, so redraw the
+        # visible part rather than scaling the existing items
+        self.canvas.delete("graph")
+        self.node_items.clear()
+        self.edge_items.clear()
+        self._draw_map()
+        self.sync()
+
+    def pan(self, dx, dy):
+        self.view.pan(dx, dy)
+        self.canvas.move("graph", dx, dy)
+        self._draw_map()
+        self.sync()
+
+    def resize(self):
+        # Same scale, larger or smaller window: only the culling changes
+        self._draw_map()
+        self.sync()
+
+    def add_node(self, node):
+        self._drop_stale_colors()
+        if self.clustering:
+            # Marked over the clusters, which are recomputed on the next zoom
+            # or pan instead of rebuilding the search arrays for every edit
+            x, y = self.view.to_screen(*self.graph_tool.positions[node])
+            self.canvas.create_oval(x - 3, y - 3, x + 3, y + 3, fill="blue", outline="black",
+                                    tags=("graph", "cluster"))
+            return
+        x, y = self.graph_tool.positions[node]
+        if self._in_region(x, y, x, y):
+            self._create_node(node)
+
+    def update_edge(self, node1, node2):
+        # New edge, or new weight for an existing one
+        self._drop_stale_colors()
+        if self.clustering:
+            (x1, y1), (x2, y2) = (self.view.to_screen(*self.graph_tool.positions[node]) for node in (node1, node2))
+            self.canvas.create_line(x1, y1, x2, y2, fill="orange", width=1, tags=("graph", "cluster"))
+            return
+        key = self._edge_key(node1, node2)
+        data = self.graph_tool.graph.edges[key]
+        if key in self.edge_items:
+            if len(self.edge_items[key]) > 1:
+                self.canvas.itemconfigure(self.edge_items[key][1], text=f"{data.get('weight', ''):.2f}")
+            return
+        (x1, y1), (x2, y2) = self.graph_tool.positions[node1], self.graph_tool.positions[node2]
+        if self._in_region(x1, y1, x2, y2):
+            self._create_edge(key, data)
 
 
 class GraphApp:
+    # Clicks further than this from every node do not select one
+    pick_radius = 25
+
     def __init__(self, root):
         self.root = root
         self.root.title("Advanced Graph Visualization Tool")
@@ -267,7 +955,8 @@ class GraphApp:
         self.canvas_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
 
         # Load map image
-        self.map_photo = self.load_map_image("map.jpg")
+        self.map_tiles = self.load_map_image("map.jpg")
+        self.view = ViewTransform()
 
         # Create canvas
         self._create_canvas()
@@ -292,7 +981,15 @@ class GraphApp:
             ("Dijkstra", self.find_dijkstra_path),
             ("BFS", self.find_bfs_path),
             ("DFS", self.find_dfs_path),
-            ("A* Search", self.find_astar_path)
+            ("A* Search", self.find_astar_path),
+            ("Bi-Dijkstra", self.find_bidirectional_dijkstra_path),
+            ("Bi-A*", self.find_bidirectional_astar_path),
+            ("CH Query", self.find_ch_path),
+            ("ALT A*", self.find_alt_path),
+            ("Chain A*", self.find_chain_path),
+            ("K Shortest", self.find_k_shortest_paths),
+            ("Alt Routes", self.find_alternative_routes),
+            ("Isochrone", self.find_isochrone)
         ]
 
         for name, command in search_algorithms:
@@ -339,11 +1036,16 @@ class GraphApp:
             # Close the selection window
             node_selection_window.destroy()
 
+            # Exact searches are answered from the all-pairs tables once built
+            search = search_method
+            if self.graph_tool.all_pairs is not None and search_method.__name__ in graph_core.EXACT_SEARCHES:
+                search = self.graph_tool.lookup_path
+
             # Visualize path
             self.graph_tool._path_visualization(
                 title,
                 start,
-                search_method,
+                search,
                 "map.jpg",
                 end_node=end
             )
@@ -387,11 +1089,89 @@ class GraphApp:
             self.graph_tool.astar_search
         )
 
+    def find_bidirectional_dijkstra_path(self):
+        self._create_node_selection_dialog(
+            "Bidirectional Dijkstra",
+            self.graph_tool.bidirectional_dijkstra
+        )
+
+    def find_bidirectional_astar_path(self):
+        self._create_node_selection_dialog(
+            "Bidirectional A*",
+            self.graph_tool.bidirectional_astar
+        )
+
+    def find_alt_path(self):
+        self._create_node_selection_dialog(
+            "ALT A* Search",
+            self.graph_tool.alt_search
+        )
+
+    def find_ch_path(self):
+        self._create_node_selection_dialog(
+            "Contraction Hierarchies",
+            self.graph_tool.ch_search
+        )
+
+    def find_chain_path(self):
+        self._create_node_selection_dialog(
+            "Chain A* Search",
+            self.graph_tool.chain_search
+        )
+
+    def find_k_shortest_paths(self):
+        self._create_node_selection_dialog(
+            "K Shortest Paths",
+            self.graph_tool.k_shortest_paths
+        )
+
+    def find_alternative_routes(self):
+        self._create_node_selection_dialog(
+            "Alternative Routes",
+            self.graph_tool.alternative_routes
+        )
+
+    def find_isochrone(self):
+        if not self.graph_tool.graph.nodes:
+            messagebox.showerror("Error", "Graph is empty")
+            return
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Isochrone")
+        dialog.geometry("300x200")
+
+        tk.Label(dialog, text="Source Nodes (comma separated):").pack()
+        sources_var = tk.StringVar(dialog, value=str(next(iter(self.graph_tool.graph.nodes))))
+        tk.Entry(dialog, textvariable=sources_var).pack()
+
+        tk.Label(dialog, text="Cost Budget:").pack()
+        budget_var = tk.StringVar(dialog, value="200")
+        tk.Entry(dialog, textvariable=budget_var).pack()
+
+        def on_confirm():
+            try:
+                sources = [int(part) for part in sources_var.get().replace(',', ' ').split()]
+                budget = float(budget_var.get())
+            except ValueError:
+                messagebox.showerror("Error", "Enter node ids and a numeric budget")
+                return
+            missing = [node for node in sources if node not in self.graph_tool.graph]
+            if not sources or missing:
+                messagebox.showerror("Error", "Selected nodes do not exist in the graph")
+                return
+            dialog.destroy()
+            self.graph_tool._isochrone_visualization(sources, budget)
+
+        button_frame = tk.Frame(dialog)
+        button_frame.pack(pady=10)
+        tk.Button(button_frame, text="Confirm", command=on_confirm).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+
     def load_map_image(self, map_path):
+        # The visualization windows use a taller copy; decode it in the background
+        map_cache.prefetch(map_path, (1200, 700))
         try:
-            map_image = Image.open(map_path)
-            map_image = map_image.resize((1200, 600), Image.LANCZOS)
-            return ImageTk.PhotoImage(map_image)
+            return MapTiles(map_cache.get(map_path, (1200, 600)))
         except FileNotFoundError:
             messagebox.showwarning("Warning", f"Map image {map_path} not found. Using blank canvas.")
             return None
@@ -410,11 +1190,18 @@ class GraphApp:
         self.canvas.configure(xscrollcommand=self.h_scrollbar.set,
                               yscrollcommand=self.v_scrollbar.set)
 
-        if self.map_photo:
-            self.canvas.create_image(0, 0, image=self.map_photo, anchor=tk.NW)
+        self.renderer = CanvasRenderer(self.canvas, self.graph_tool, self.view)
+        self.renderer.redraw(self.map_tiles)
 
-        # Bind mouse wheel for zooming (basic implementation)
+        # Mouse wheel zooms around the pointer (Button-4/5 on X11), right drag pans
         self.canvas.bind("<MouseWheel>", self.zoom)
+        self.canvas.bind("<Button-4>", self.zoom)
+        self.canvas.bind("<Button-5>", self.zoom)
+        self.canvas.bind("<ButtonPress-3>", self.start_pan)
+        self.canvas.bind("<B3-Motion>", self.pan)
+        self.canvas_size = None
+        self.resize_job = None
+        self.canvas.bind("<Configure>", self.on_resize)
 
         # Status bar
         self.status_var = tk.StringVar()
@@ -447,6 +1234,40 @@ class GraphApp:
         # Graph management buttons
         tk.Button(graph_frame, text="Save Graph", command=self.save_graph).pack(side=tk.LEFT, padx=5)
         tk.Button(graph_frame, text="Load Graph", command=self.load_graph).pack(side=tk.LEFT, padx=5)
+        tk.Button(graph_frame, text="Import", command=self.import_graph).pack(side=tk.LEFT, padx=5)
+        tk.Button(graph_frame, text="Build CH", command=self.build_hierarchy).pack(side=tk.LEFT, padx=5)
+        tk.Button(graph_frame, text="Build Landmarks", command=self.build_landmarks).pack(side=tk.LEFT, padx=5)
+        tk.Button(graph_frame, text="Preprocess", command=self.preprocess_graph).pack(side=tk.LEFT, padx=5)
+        tk.Button(graph_frame, text="Analytics", command=self.show_analytics).pack(side=tk.LEFT, padx=5)
+        tk.Button(graph_frame, text="Cache Stats", command=self.show_cache_stats).pack(side=tk.LEFT, padx=5)
+
+        # Profiling Tab: timers, counters and memory, refreshed while shown
+        self.profile_frame = tk.Frame(self.notebook)
+        self.notebook.add(self.profile_frame, text="Profiling")
+
+        columns = ("calls", "total", "mean", "max")
+        self.stats_table = ttk.Treeview(self.profile_frame, columns=columns, height=4)
+        self.stats_table.heading("#0", text="Event")
+        for column, heading in zip(columns, ("Calls", "Total s", "Mean ms", "Max ms")):
+            self.stats_table.heading(column, text=heading)
+            self.stats_table.column(column, width=80, anchor=tk.E)
+        self.stats_table.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+
+        stats_side = tk.Frame(self.profile_frame)
+        stats_side.pack(side=tk.LEFT, fill=tk.Y, padx=5)
+        self.stats_label = tk.Label(stats_side, justify=tk.LEFT, anchor=tk.W, font=("Arial", 9))
+        self.stats_label.pack(anchor=tk.W)
+        stats_buttons = tk.Frame(stats_side)
+        stats_buttons.pack(anchor=tk.W)
+        self.trace_memory_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(stats_buttons, text="Trace Memory", variable=self.trace_memory_var,
+                       command=lambda: graph_core.Profiler.trace_memory(self.trace_memory_var.get())
+                       ).pack(side=tk.LEFT, padx=5)
+        tk.Button(stats_buttons, text="Reset", command=self.graph_tool.profiler.reset).pack(side=tk.LEFT, padx=5)
+        tk.Button(stats_buttons, text="Export JSONL", command=self.export_stats).pack(side=tk.LEFT, padx=5)
+        self.stats_log_button = tk.Button(stats_buttons, text="Log to File", command=self.toggle_stats_log)
+        self.stats_log_button.pack(side=tk.LEFT, padx=5)
+        self.refresh_stats()
 
         # Bind canvas click
         self.canvas.bind("<Button-1>", self.on_canvas_click)
@@ -468,25 +1289,61 @@ class GraphApp:
         self.status_var.set("Add Edge Mode: Select two nodes to connect")
 
     def zoom(self, event):
-        # Basic zoom implementation
-        scale = 1.0
-        if event.delta > 0:
-            scale *= 1.1
+        if event.num == 4 or event.delta > 0:
+            scale = 1.1
         else:
-            scale /= 1.1
-
-        # Zoom around mouse pointer
-        x = self.canvas.canvasx(event.x)
-        y = self.canvas.canvasy(event.y)
-        self.canvas.scale('all', x, y, scale, scale)
+            scale = 1 / 1.1
+
+        # Zoom around mouse pointer; the timing records the items left drawn
+        with self.graph_tool.profiler.timer("canvas.zoom") as fields:
+            self.renderer.zoom(scale, event.x, event.y)
+            fields['canvas_items'] = len(self.canvas.find_all())
+        self.status_var.set(f"Zoom {self.view.zoom:.0%}")
+
+    def on_resize(self, event):
+        # Dragging the window edge sends a stream of Configure events: re-cull
+        # once the size has settled, and only if it actually changed
+        if (event.width, event.height) == self.canvas_size:
+            return
+        self.canvas_size = (event.width, event.height)
+        if self.resize_job is not None:
+            self.root.after_cancel(self.resize_job)
+        self.resize_job = self.root.after(150, self._finish_resize)
+
+    def _finish_resize(self):
+        self.resize_job = None
+        with self.graph_tool.profiler.timer("canvas.resize") as fields:
+            self.renderer.resize()
+            fields['canvas_items'] = len(self.canvas.find_all())
+
+    def start_pan(self, event):
+        self._pan_anchor = (event.x, event.y)
+
+    def pan(self, event):
+        last_x, last_y = self._pan_anchor
+        self._pan_anchor = (event.x, event.y)
+        self.renderer.pan(event.x - last_x, event.y - last_y)
+
+    def _search_running(self):
+        # A visualization's worker thread reads the graph tool while it searches,
+        # so nothing may change the graph (or its caches) until it is done
+        if self.graph_tool.progress is None:
+            return False
+        messagebox.showinfo("Search running", "Wait for the running search to finish or cancel it first.")
+        return True
 
     def on_canvas_click(self, event):
-        x, y = event.x, event.y
+        if (self.add_node_mode or self.add_edge_mode) and self._search_running():
+            return
+        # Graph positions are in map coordinates, independent of zoom and pan
+        x, y = self.view.to_world(event.x, event.y)
+        if self.view.zoom == 1:
+            x, y = round(x), round(y)
 
         if self.add_node_mode:
             node_id = self.graph_tool.add_node((x, y))
-            self._update_canvas()
-            self.status_var.set(f"Node {node_id} added at ({x}, {y})")
+            self.renderer.add_node(node_id)
+            self.status_var.set(f"Node {node_id} added at ({x:.0f}, {y:.0f})")
 
         elif self.add_edge_mode:
             closest_node = self._find_closest_node(x, y)
@@ -496,10 +1353,11 @@ class GraphApp:
                     weight = simpledialog.askfloat("Edge Weight",
                                                    "Enter edge weight (or leave blank for auto):",
                                                    initialvalue=None)
-                    self.graph_tool.add_edge(self.first_selected_node, closest_node, weight)
+                    first_node = self.first_selected_node
+                    self.graph_tool.add_edge(first_node, closest_node, weight)
                     self.first_selected_node = None
-                    self._update_canvas()
-                    self.status_var.set(f"Edge added between nodes {self.first_selected_node} and {closest_node}")
+                    self.renderer.update_edge(first_node, closest_node)
+                    self.status_var.set(f"Edge added between nodes {first_node} and {closest_node}")
                 else:
                     self.first_selected_node = closest_node
                     self.status_var.set(f"First node selected: {closest_node}")
@@ -509,31 +1367,32 @@ class GraphApp:
             messagebox.showwarning("Warning", "Add nodes first")
             return None
 
-        return min(
-            self.graph_tool.positions.keys(),
-            key=lambda node: ((self.graph_tool.positions[node][0] - x) ** 2 +
-                              (self.graph_tool.positions[node][1] - y) ** 2)
-        )
+        node = self.graph_tool.nearest_node(x, y, self.pick_radius / self.view.zoom)
+        if node is None:
+            self.status_var.set(f"No node within {self.pick_radius} pixels of the click")
+        return node
 
     def save_graph(self):
+        if self._search_running():
+            return
         filename = filedialog.asksaveasfilename(
             defaultextension=".graph",
             filetypes=[("Graph files", "*.graph")]
         )
         if filename:
-            with open(filename, 'wb') as f:
-                pickle.dump((self.graph_tool.graph, self.graph_tool.positions, self.graph_tool.current_node), f)
+            self.graph_tool.save(filename)
             messagebox.showinfo("Success", f"Graph saved as {filename}")
             self.status_var.set(f"Graph saved to {filename}")
 
     def load_graph(self):
+        if self._search_running():
+            return
         filename = filedialog.askopenfilename(
             filetypes=[("Graph files", "*.graph")]
         )
         if filename:
             try:
-                with open(filename, 'rb') as f:
-                    self.graph_tool.graph, self.graph_tool.positions, self.graph_tool.current_node = pickle.load(f)
+                self.graph_tool.load(filename)
                 self._update_canvas()
                 messagebox.showinfo("Success", f"Graph loaded from {filename}")
                 self.status_var.set(f"Graph loaded from {filename}")
@@ -541,42 +1400,230 @@ class GraphApp:
                 messagebox.showerror("Error", f"Could not load graph: {str(e)}")
                 self.status_var.set("Graph load failed")
 
-    def clear_graph(self):
-        # Reset graph tool completely
-        self.graph_tool = GraphTool()
+    def import_graph(self):
+        # OSM extract, or an edge list followed by its node file; coordinates
+        # are scaled onto the map
+        if self._search_running():
+            return
+        filename = filedialog.askopenfilename(
+            title="Import OSM extract or edge list",
+            filetypes=[("OSM or edge list", "*.osm *.pbf *.csv *.txt *.edges"), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+        nodes_file = None
+        if not filename.endswith(('.osm', '.pbf')):
+            nodes_file = filedialog.askopenfilename(
+                title="Node file (id,x,y)",
+                filetypes=[("Node files", "*.csv *.txt"), ("All files", "*.*")]
+            )
+            if not nodes_file:
+                return
+        try:
+            if nodes_file:
+                stats = graph_import.import_graph(self.graph_tool, nodes_file, filename, fit=(1200, 600))
+            else:
+                stats = graph_import.import_graph(self.graph_tool, osm_file=filename, fit=(1200, 600))
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not import graph: {str(e)}")
+            self.status_var.set("Graph import failed")
+            return
         self._update_canvas()
-        self.status_var.set("Graph cleared")
+        seconds = stats['parse_seconds'] + stats['build_seconds']
+        self.status_var.set(f"Imported {stats['nodes']} nodes, {stats['edges']} edges in {seconds:.2f}s "
+                            f"({stats['edges_per_second']:.0f} edges/s, {stats['dropped_edges']} dropped)")
 
-    def _update_canvas(self):
-        # Clear existing canvas content
-        self.canvas.delete("all")
+    def build_hierarchy(self):
+        if self._search_running():
+            return
+        if not self.graph_tool.graph.nodes:
+            messagebox.showerror("Error", "Graph is empty")
+            return
+        ch = self.graph_tool.build_contraction_hierarchy()
+        self.status_var.set(f"Contraction hierarchy built with {len(ch.up_targets)} upward edges")
 
-        # Redraw map if exists
-        if self.map_photo:
-            self.canvas.create_image(0, 0, image=self.map_photo, anchor=tk.NW)
+    def build_landmarks(self):
+        if self._search_running():
+            return
+        if not self.graph_tool.graph.nodes:
+            messagebox.showerror("Error", "Graph is empty")
+            return
+        count = simpledialog.askinteger("Landmarks", "Number of landmarks:", initialvalue=8, minvalue=1)
+        if count is None:
+            return
+        avoid = messagebox.askyesno("Landmarks", "Use the 'avoid' selection strategy?\n(No selects farthest landmarks)")
+        strategy = "avoid" if avoid else "farthest"
+        landmarks = self.graph_tool.build_landmarks(count, strategy)
+        self.status_var.set(f"{len(landmarks.landmarks)} landmarks selected ({strategy})")
 
-        # Draw nodes
-        for node, pos in self.graph_tool.positions.items():
-            x, y = pos
-            self.canvas.create_oval(x - 7, y - 7, x + 7, y + 7, fill="blue", outline="black")
-            self.canvas.create_text(x, y - 15, text=str(node), font=("Arial", 10))
+    def preprocess_graph(self):
+        if self._search_running():
+            return
+        if not len(self.graph_tool.csr):
+            messagebox.showerror("Error", "Graph is empty")
+            return
+        stats = self.graph_tool.preprocess()
+        self.status_var.set(f"{stats['components']} components (largest {stats['largest_component']} nodes); "
+                            f"{stats['chain_nodes']} chain nodes contracted, Chain A* searches "
+                            f"{stats['kept_nodes']} nodes and {stats['search_edges']} edges")
+
+    def show_analytics(self):
+        # All-pairs tables, then eccentricity, diameter and betweenness; nodes
+        # are colored by betweenness and later exact queries use the tables.
+        # The work runs in a worker thread behind a progress dialog that can
+        # cancel it, with the graph locked for editing like during a search.
+        if self._search_running():
+            return
+        if not len(self.graph_tool.csr):
+            messagebox.showerror("Error", "Graph is empty")
+            return
 
-        # Draw edges with weights
-        for edge in self.graph_tool.graph.edges(data=True):
-            node1, node2, data = edge
-            x1, y1 = self.graph_tool.positions[node1]
-            x2, y2 = self.graph_tool.positions[node2]
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Analytics")
+        dialog.transient(self.root)
+        info_label = tk.Label(dialog, text="Building all-pairs tables...", width=50)
+        info_label.pack(padx=10, pady=5)
+        progress_bar = ttk.Progressbar(dialog, length=400, maximum=1.0)
+        progress_bar.pack(padx=10, pady=5)
+        cancel_button = tk.Button(dialog, text="Cancel")
+        cancel_button.pack(pady=5)
+        messages = queue.Queue()
+        cancelled = threading.Event()
+
+        def report_progress(done, remaining, new_nodes=()):
+            # Runs in the worker, for the table build and each betweenness pass
+            if cancelled.is_set():
+                raise graph_core.SearchCancelled()
+            messages.put(('progress', done, remaining))
+
+        def progress(order, frontier):
+            report_progress(len(order), frontier[-1])
+
+        def run_analytics():
+            try:
+                if self.graph_tool.all_pairs is None:
+                    self.graph_tool.build_all_pairs(progress=progress)
+                messages.put(('tables',))
+                messages.put(('done', self.graph_tool.analytics(progress=progress)))
+            except graph_core.SearchCancelled:
+                messages.put(('cancelled',))
+            except Exception as e:
+                messages.put(('failed', e))
+            finally:
+                self.graph_tool.progress = None
+
+        def cancel_analytics():
+            cancelled.set()
+            cancel_button.config(state=tk.DISABLED)
+            info_label.config(text="Cancelling...")
+
+        def poll_analytics():
+            while True:
+                try:
+                    message = messages.get_nowait()
+                except queue.Empty:
+                    self.root.after(50, poll_analytics)
+                    return
+                if message[0] == 'progress':
+                    _, done, remaining = message
+                    progress_bar['value'] = done / max(done + remaining, 1)
+                elif message[0] == 'tables':
+                    info_label.config(text="Computing betweenness...")
+                else:
+                    break
+
+            dialog.destroy()
+            if message[0] == 'cancelled':
+                self.status_var.set("Analytics cancelled")
+            elif message[0] == 'failed':
+                messagebox.showerror("Error", str(message[1]))
+                self.status_var.set("Analytics failed")
+            else:
+                show_results(message[1])
+
+        def show_results(analytics):
+            betweenness = analytics['betweenness']
+            highest = max(betweenness.values()) or 1.0
+            self.renderer.color_nodes({node: centrality_color(value / highest)
+                                       for node, value in betweenness.items()})
+
+            central = sorted(betweenness, key=betweenness.get, reverse=True)[:5]
+            messagebox.showinfo("Analytics", "\n".join([
+                f"Diameter: {analytics['diameter']:.2f}",
+                f"Radius: {analytics['radius']:.2f}",
+                "Most central nodes (betweenness):",
+                *(f"  {node}: {betweenness[node]:.4f}" for node in central),
+            ]))
+            self.status_var.set("Nodes colored by betweenness (blue low, red high); "
+                                "exact searches now use table lookups")
+
+        cancel_button.config(command=cancel_analytics)
+        dialog.protocol("WM_DELETE_WINDOW", cancel_analytics)
+        # Marks the graph tool busy, so edits and searches wait for the worker
+        self.graph_tool.progress = report_progress
+        threading.Thread(target=run_analytics, daemon=True).start()
+        poll_analytics()
+
+    def show_cache_stats(self):
+        if self._search_running():
+            return
+        stats = self.graph_tool.query_cache.stats()
+        messagebox.showinfo("Query Cache", "\n".join(f"{name}: {value}" for name, value in stats.items()))
+
+    def refresh_stats(self):
+        # Runs once a second; the table is only rebuilt while its tab is shown
+        if self.notebook.select() == str(self.profile_frame):
+            summary = self.graph_tool.profiler.summary()
+            self.stats_table.delete(*self.stats_table.get_children())
+            for event, timer in sorted(summary['timers'].items()):
+                self.stats_table.insert("", tk.END, text=event, values=(
+                    timer['calls'], f"{timer['total_seconds']:.3f}",
+                    f"{timer['mean_ms']:.2f}", f"{timer['max_ms']:.2f}"))
+            counters = "  ".join(f"{name}: {value:,}" for name, value in sorted(summary['counters'].items()))
+            memory = "  ".join(f"{name}: {value:,}" for name, value in summary['memory'].items())
+            self.stats_label.config(text=f"{counters or 'No events yet'}\n{memory}")
+        self.root.after(1000, self.refresh_stats)
+
+    def export_stats(self):
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".jsonl",
+            filetypes=[("JSON lines", "*.jsonl")]
+        )
+        if filename:
+            count = self.graph_tool.profiler.export(filename)
+            self.status_var.set(f"Exported {count} profiling records to {filename}")
+
+    def toggle_stats_log(self):
+        # Append every new record to a file, e.g. to collect whole sessions
+        profiler = self.graph_tool.profiler
+        if profiler.log_path:
+            self.status_var.set(f"Stopped logging profiling records to {profiler.log_path}")
+            profiler.log_path = None
+            self.stats_log_button.config(text="Log to File")
+            return
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".jsonl",
+            filetypes=[("JSON lines", "*.jsonl")]
+        )
+        if filename:
+            profiler.log_path = filename
+            self.stats_log_button.config(text="Stop Log")
+            self.status_var.set(f"Logging profiling records to {filename}")
 
-            # Draw edge
-            self.canvas.create_line(x1, y1, x2, y2, fill="orange", width=3)
+    def clear_graph(self):
+        if self._search_running():
+            return
+        # Reset graph tool completely
+        self.graph_tool.clear()
+        self._update_canvas()
+        self.status_var.set("Graph cleared")
 
-            # Draw weight
-            mid_x = (x1 + x2) / 2
-            mid_y = (y1 + y2) / 2
-            self.canvas.create_text(mid_x, mid_y,
-                                    text=f"{data.get('weight', ''):.2f}",
-                                    font=("Arial", 8),
-                                    fill="red")
+    def _update_canvas(self):
+        # Full redraw; edits update the canvas through the renderer instead
+        with self.graph_tool.profiler.timer("canvas.redraw") as fields:
+            self.renderer.redraw(self.map_tiles)
+            fields['canvas_items'] = len(self.canvas.find_all())
+            fields['clustering'] = self.renderer.clustering
 
 
 def main():
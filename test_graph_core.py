@@ -0,0 +1,170 @@
+import itertools
+import random
+
+import networkx as nx
+import pytest
+
+import graph_core
+
+
+def random_graph(seed, n=60, extra=30, max_weight=50, chains=True):
+    # A random spanning tree plus extra edges, with integer weights unrelated to
+    # the node positions so a Euclidean estimate would overestimate. Optional
+    # degree-2 chains give the chain compression something to contract.
+    rng = random.Random(seed)
+    graph_tool = graph_core.GraphTool()
+    for _ in range(n):
+        graph_tool.add_node((rng.uniform(0, 1000), rng.uniform(0, 1000)))
+    for node in range(1, n):
+        graph_tool.add_edge(node, rng.randrange(node), rng.randint(0, max_weight))
+    for _ in range(extra):
+        a, b = rng.sample(range(n), 2)
+        graph_tool.add_edge(a, b, rng.randint(0, max_weight))
+    if chains:
+        for _ in range(5):
+            previous = rng.randrange(n)
+            for _ in range(rng.randint(2, 6)):
+                node = graph_tool.add_node((rng.uniform(0, 1000), rng.uniform(0, 1000)))
+                graph_tool.add_edge(previous, node, rng.randint(0, max_weight))
+                previous = node
+            graph_tool.add_edge(previous, rng.randrange(n), rng.randint(0, max_weight))
+    return graph_tool
+
+
+def pairs(graph_tool, count, seed):
+    rng = random.Random(seed)
+    nodes = sorted(graph_tool.graph.nodes)
+    return [(rng.choice(nodes), rng.choice(nodes)) for _ in range(count)]
+
+
+def assert_shortest(graph_tool, search, source, target):
+    # Searches return (nodes, edges, order); the edges must chain from source
+    # to target and weigh as much as the networkx shortest path
+    _, edges, _ = search(source, target)
+    path = [source] + [v for _, v in edges]
+    assert not edges or edges[0][0] == source
+    assert all(u == v for (_, u), (v, _) in zip(edges, edges[1:]))
+    assert path[-1] == target
+    expected = nx.dijkstra_path_length(graph_tool.graph, source, target)
+    assert graph_tool.path_length(path) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("landmarks", [False, True])
+def test_chain_search_matches_networkx(seed, landmarks):
+    graph_tool = random_graph(seed)
+    graph_tool.build_chain_compression()
+    if landmarks:
+        graph_tool.build_landmarks(count=4)
+    for source, target in pairs(graph_tool, 20, seed):
+        assert_shortest(graph_tool, graph_tool.chain_search, source, target)
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("search", ["ch_search", "alt_search", "lookup_path"])
+def test_exact_searches_match_networkx(seed, search):
+    graph_tool = random_graph(seed)
+    graph_tool.build_contraction_hierarchy()
+    graph_tool.build_landmarks(count=4)
+    graph_tool.build_all_pairs()
+    for source, target in pairs(graph_tool, 20, seed):
+        assert_shortest(graph_tool, getattr(graph_tool, search), source, target)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("method", ["floyd_warshall", "dijkstra"])
+def test_analytics_match_networkx(seed, method):
+    # Weights 1..4 leave plenty of equal-length paths for sigma to count
+    graph_tool = random_graph(seed, max_weight=4)
+    for u, v, data in graph_tool.graph.edges(data=True):
+        data['weight'] += 1
+    graph_tool.mark_modified()
+    graph_tool.build_all_pairs(method=method, processes=1)
+    result = graph_tool.analytics()
+    lengths = dict(nx.all_pairs_dijkstra_path_length(graph_tool.graph))
+    expected = nx.betweenness_centrality(graph_tool.graph, weight='weight')
+    for node in graph_tool.graph:
+        assert result['eccentricity'][node] == pytest.approx(max(lengths[node].values()))
+        assert result['betweenness'][node] == pytest.approx(expected[node], abs=1e-12)
+
+
+def min_hop_betweenness(graph):
+    # Reference by enumeration: every simple path, keeping those shortest by
+    # weight and then by hop count, which is how zero-weight ties are broken
+    betweenness = dict.fromkeys(graph, 0.0)
+    for source, target in itertools.permutations(graph, 2):
+        paths = list(nx.all_simple_paths(graph, source, target))
+        keys = [(round(nx.path_weight(graph, path, 'weight'), 9), len(path)) for path in paths]
+        shortest = [path for path, key in zip(paths, keys) if key == min(keys)]
+        for path in shortest:
+            for node in path[1:-1]:
+                betweenness[node] += 1.0 / len(shortest)
+    n = len(graph)
+    return {node: value / ((n - 1) * (n - 2)) for node, value in betweenness.items()}
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_betweenness_with_zero_weight_edges(seed):
+    rng = random.Random(seed)
+    graph_tool = random_graph(seed, n=rng.randint(3, 9), extra=rng.randint(0, 6), chains=False)
+    for u, v, data in graph_tool.graph.edges(data=True):
+        data['weight'] = rng.choice([0.0, round(rng.uniform(1, 10), 3)])
+    graph_tool.mark_modified()
+    result = graph_tool.analytics()['betweenness']
+    expected = min_hop_betweenness(graph_tool.graph)
+    for node in graph_tool.graph:
+        assert result[node] == pytest.approx(expected[node], abs=1e-12)
+
+
+def test_lookup_path_without_tables_reports_error():
+    graph_tool = random_graph(0)
+    assert graph_tool.lookup_path(0, 1) == (set(), [], [])
+    assert graph_tool.last_error
+
+
+@pytest.mark.parametrize("method", ["floyd_warshall", "dijkstra"])
+def test_analytics_progress_and_cancel(method):
+    graph_tool = random_graph(1, n=300, chains=False)
+    calls = []
+    graph_tool.build_all_pairs(method=method, processes=1, progress=lambda order, frontier: calls.append(len(order)))
+    assert calls
+    calls.clear()
+    graph_tool.analytics(progress=lambda order, frontier: calls.append(len(order)))
+    assert calls
+
+    def cancel(order, frontier):
+        raise graph_core.SearchCancelled()
+
+    graph_tool.mark_modified()
+    with pytest.raises(graph_core.SearchCancelled):
+        graph_tool.build_all_pairs(method=method, processes=1, progress=cancel)
+    assert graph_tool.all_pairs is None
+
+
+@pytest.mark.parametrize("search", ["alt_search", "chain_search"])
+def test_first_use_builds_can_be_cancelled(search):
+    # The landmarks and chains are built inside the search on first use; the
+    # search's progress callback must be able to stop that build too
+    graph_tool = random_graph(2, n=2000, extra=200)
+    calls = []
+
+    def cancel(settled, frontier, new_nodes):
+        calls.append(settled)
+        raise graph_core.SearchCancelled()
+
+    graph_tool.progress = cancel
+    with pytest.raises(graph_core.SearchCancelled):
+        getattr(graph_tool, search)(0, 1)
+    assert calls
+    assert graph_tool.landmarks is None and graph_tool.compression is None
+
+
+@pytest.mark.parametrize("weight", [-1.0, float('nan'), float('inf')])
+def test_update_edges_rejects_bad_weights(weight):
+    graph_tool = random_graph(3)
+    u, v, old = next(iter(graph_tool.graph.edges(data='weight')))
+    before = graph_tool.dijkstra(u, v)
+    with pytest.raises(ValueError):
+        graph_tool.update_edges([(u, v, old + 1.0), (u, v, weight)])
+    assert graph_tool.graph.edges[u, v]['weight'] == old
+    assert graph_tool.dijkstra(u, v) == before